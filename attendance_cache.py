@@ -0,0 +1,272 @@
+"""
+Local SQLite cache of Firestore attendance records.
+Past attendance never changes, so reports only fetch records newer than the
+last sync (minus a small reconciliation window) and read everything else from
+the cache. Reports over already-cached months are built fully offline.
+"""
+import os
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+# Fixed-width UTC format so timestamps compare correctly as strings in SQLite
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def to_utc(dt: datetime) -> datetime:
+    """Converts a datetime to UTC, treating naive datetimes as UTC like Firestore does."""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _timestamp_key(dt: datetime) -> str:
+    return to_utc(dt).strftime(TIMESTAMP_FORMAT)
+
+
+def _parse_timestamp_key(key: str) -> datetime:
+    return datetime.strptime(key, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return to_utc(value).isoformat()
+    return str(value)
+
+
+class AttendanceCache:
+    """
+    Caches attendance records by document ID and tracks, per section, the time
+    range that has been fetched from Firestore.
+
+    Args:
+        db_path: Path to the cache database
+        reconciliation_window: How far before the high-water mark records are
+            fetched again, to pick up late writes and edits to recent days
+        max_age: Records older than this are evicted by evict()
+        max_records: If set, evict() keeps at most about this many newest records
+    """
+
+    ALL_SECTIONS = '*'
+
+    def __init__(self, db_path: str = 'attendance_cache.db', reconciliation_window: timedelta = timedelta(days=2),
+                 max_age: Optional[timedelta] = timedelta(days=400), max_records: Optional[int] = None):
+        self.db_path = db_path
+        self.reconciliation_window = reconciliation_window
+        self.max_age = max_age
+        self.max_records = max_records
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            self.create_tables(conn)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def create_tables(self, conn: sqlite3.Connection) -> None:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS attendance (
+                doc_id TEXT PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                section TEXT,
+                data TEXT NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_attendance_timestamp ON attendance (timestamp)')
+        # Fetched range per section; '*' is the range fetched for all sections
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                section TEXT PRIMARY KEY,
+                covered_from TEXT NOT NULL,
+                high_water_mark TEXT NOT NULL,
+                synced_at TEXT
+            )
+        ''')
+        conn.commit()
+
+    def get_records(self, importer, start_date: datetime, end_date: datetime,
+                    section: str | None = None) -> List[Dict[str, Any]]:
+        """
+        Returns the attendance records for the date range, fetching from
+        Firestore only what the cache does not cover yet.
+
+        Args:
+            importer: A FirestoreDataImporter used for the missing part of the range
+            start_date: Start of the date range
+            end_date: End of the date range
+            section: Optional section filter
+
+        Returns:
+            List of attendance record dicts, as returned by doc.to_dict()
+        """
+        start, end = to_utc(start_date), to_utc(end_date)
+        now = datetime.now(timezone.utc)
+
+        conn = self._connect()
+        try:
+            coverage = self._get_coverage(conn, section)
+            fetch_range = self._fetch_range(coverage, start, end)
+
+            if fetch_range is not None:
+                fetch_from, fetch_to = fetch_range
+                print(f"Fetching attendance records from {fetch_from:%Y-%m-%d %H:%M} "
+                      f"to {fetch_to:%Y-%m-%d %H:%M} from Firestore...")
+                docs = importer.import_data(fetch_from, fetch_to, section)
+                self._store(conn, docs, fetch_from, fetch_to, section)
+
+                covered_from = fetch_from if coverage is None else min(coverage[0], fetch_from)
+                high_water_mark = min(fetch_to, now)
+                if coverage is not None:
+                    high_water_mark = max(coverage[1], high_water_mark)
+                self._set_coverage(conn, section or self.ALL_SECTIONS, covered_from, high_water_mark)
+            else:
+                print("Attendance records loaded from the local cache.")
+
+            return self._load(conn, start, end, section)
+        finally:
+            conn.close()
+
+    def _get_coverage(self, conn: sqlite3.Connection, section: str | None) -> Optional[tuple]:
+        """Gets the (covered_from, high_water_mark) range usable for the section."""
+        scopes = [self.ALL_SECTIONS] + ([section] if section else [])
+        best = None
+        for scope in scopes:
+            row = conn.execute(
+                'SELECT covered_from, high_water_mark FROM sync_state WHERE section = ?', (scope,)
+            ).fetchone()
+            if row is None:
+                continue
+            coverage = (_parse_timestamp_key(row[0]), _parse_timestamp_key(row[1]))
+            # Prefer the range reaching furthest forward
+            if best is None or coverage[1] > best[1]:
+                best = coverage
+        return best
+
+    def _fetch_range(self, coverage: Optional[tuple], start: datetime, end: datetime) -> Optional[tuple]:
+        """
+        Works out the (from, to) range to fetch, or None if the cache covers the range.
+        The fetched range always reaches the covered one, so coverage stays a
+        single span without gaps that were never fetched.
+        """
+        if coverage is None:
+            return start, end
+
+        covered_from, high_water_mark = coverage
+        if start < covered_from:
+            # Fill the gap up to the covered range when the request ends before it
+            return start, max(end, covered_from)
+
+        settled_until = high_water_mark - self.reconciliation_window
+        if end <= settled_until:
+            return None
+        if start > high_water_mark:
+            # Fill the gap after the high-water mark when the request starts past it
+            return settled_until, end
+        return max(start, settled_until), end
+
+    def _store(self, conn: sqlite3.Connection, docs, fetch_from: datetime, fetch_to: datetime,
+               section: str | None) -> None:
+        """Replaces the cached records of the fetched range with the fetched documents."""
+        rows = []
+        for doc in docs:
+            data = doc.to_dict()
+            timestamp = data.get('timestamp')
+            if not isinstance(timestamp, datetime):
+                continue
+            rows.append((
+                doc.id,
+                _timestamp_key(timestamp),
+                data.get('studentSection'),
+                json.dumps(data, default=_json_default),
+            ))
+
+        with conn:
+            # Drop records deleted in Firestore since they were cached
+            query = 'DELETE FROM attendance WHERE timestamp >= ? AND timestamp <= ?'
+            params = [_timestamp_key(fetch_from), _timestamp_key(fetch_to)]
+            if section:
+                query += ' AND section = ?'
+                params.append(section)
+            conn.execute(query, params)
+            conn.executemany(
+                'INSERT OR REPLACE INTO attendance (doc_id, timestamp, section, data) VALUES (?, ?, ?, ?)',
+                rows
+            )
+
+    def _set_coverage(self, conn: sqlite3.Connection, scope: str, covered_from: datetime,
+                      high_water_mark: datetime) -> None:
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO sync_state (section, covered_from, high_water_mark, synced_at) VALUES (?, ?, ?, ?)',
+                (scope, _timestamp_key(covered_from), _timestamp_key(high_water_mark), datetime.now().isoformat())
+            )
+
+    def _load(self, conn: sqlite3.Connection, start: datetime, end: datetime,
+              section: str | None) -> List[Dict[str, Any]]:
+        query = 'SELECT timestamp, data FROM attendance WHERE timestamp >= ? AND timestamp <= ?'
+        params = [_timestamp_key(start), _timestamp_key(end)]
+        if section:
+            query += ' AND section = ?'
+            params.append(section)
+        query += ' ORDER BY timestamp'
+
+        records = []
+        for timestamp, data in conn.execute(query, params):
+            record = json.loads(data)
+            record['timestamp'] = _parse_timestamp_key(timestamp)
+            records.append(record)
+        return records
+
+    def evict(self) -> int:
+        """
+        Removes records older than max_age and, if max_records is set, the
+        oldest records beyond that count. The fetched ranges are shrunk to match,
+        so evicted periods are fetched again when needed.
+
+        Returns:
+            Number of records removed
+        """
+        cutoffs = []
+        conn = self._connect()
+        try:
+            if self.max_age is not None:
+                cutoffs.append(_timestamp_key(datetime.now(timezone.utc) - self.max_age))
+            if self.max_records is not None:
+                row = conn.execute(
+                    'SELECT timestamp FROM attendance ORDER BY timestamp DESC LIMIT 1 OFFSET ?',
+                    (max(self.max_records - 1, 0),)
+                ).fetchone()
+                if row is not None:
+                    cutoffs.append(row[0])
+            if not cutoffs:
+                return 0
+
+            cutoff = max(cutoffs)
+            with conn:
+                removed = conn.execute('DELETE FROM attendance WHERE timestamp < ?', (cutoff,)).rowcount
+                conn.execute('UPDATE sync_state SET covered_from = ? WHERE covered_from < ?', (cutoff, cutoff))
+                # Ranges that were evicted entirely no longer cover anything
+                conn.execute('DELETE FROM sync_state WHERE high_water_mark < covered_from')
+            if removed:
+                print(f"Evicted {removed} cached attendance records.")
+            return removed
+        finally:
+            conn.close()
+
+    def clear(self) -> None:
+        """Removes every cached record and fetched range."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM attendance')
+                conn.execute('DELETE FROM sync_state')
+        finally:
+            conn.close()
@@ -0,0 +1,108 @@
+"""
+Columnar snapshots of fetched attendance records.
+Attendance is saved as an uncompressed Arrow IPC file with compact column
+types (categorical names, section and year, boolean isAbsent, UTC timestamps),
+which is read back through a memory map without parsing any records.
+"""
+import os
+from datetime import datetime
+from typing import Any, Dict, List
+import pandas as pd
+from attendance_cache import to_utc
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+# Columns kept in a snapshot, as named in the attendance records
+SNAPSHOT_COLUMNS = ['lrn', 'lastName', 'firstName', 'studentYear', 'studentSection', 'timestamp', 'isAbsent']
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("pyarrow is required for attendance snapshots. Install it with 'pip install pyarrow'.")
+
+
+def records_to_frame(records_list: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Builds a compactly typed attendance DataFrame from record dicts.
+
+    Args:
+        records_list: Attendance records, as returned by doc.to_dict()
+
+    Returns:
+        DataFrame with the snapshot columns; fields not in SNAPSHOT_COLUMNS are dropped
+    """
+    df = pd.DataFrame(records_list, columns=SNAPSHOT_COLUMNS)
+    df['lrn'] = df['lrn'].astype(str)
+    # Every student repeats once per school day, so the per-student columns
+    # are stored as categories rather than one string per record
+    for column in ['lastName', 'firstName', 'studentYear', 'studentSection']:
+        df[column] = df[column].astype('category')
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+    df['isAbsent'] = df['isAbsent'].astype('boolean').fillna(False).astype(bool)
+    return df
+
+
+def save_snapshot(df: pd.DataFrame, snapshot_path: str) -> None:
+    """
+    Saves an attendance DataFrame as an Arrow IPC snapshot.
+
+    The file is left uncompressed so load_snapshot can memory-map it.
+
+    Args:
+        df: Attendance DataFrame, e.g. from records_to_frame
+        snapshot_path: Path of the snapshot file to write
+    """
+    _require_pyarrow()
+    directory = os.path.dirname(snapshot_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(snapshot_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def load_snapshot(snapshot_path: str, start_date: datetime | None = None, end_date: datetime | None = None,
+                  section: str | None = None) -> pd.DataFrame:
+    """
+    Loads an attendance snapshot.
+
+    The file is read through a memory map, so nothing is parsed, but
+    table.to_pandas() copies every column out of the map into the DataFrame.
+
+    Args:
+        snapshot_path: Path of the snapshot file
+        start_date: Optional start of the date range to keep
+        end_date: Optional end of the date range to keep
+        section: Optional section filter
+
+    Returns:
+        Attendance DataFrame with the snapshot column types
+
+    Raises:
+        FileNotFoundError: If the snapshot file does not exist
+    """
+    _require_pyarrow()
+    if not os.path.isfile(snapshot_path):
+        raise FileNotFoundError(f"Attendance snapshot not found: {snapshot_path}")
+
+    with pa.memory_map(snapshot_path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    df = table.to_pandas()
+
+    mask = pd.Series(True, index=df.index)
+    if start_date is not None:
+        mask &= df['timestamp'] >= to_utc(start_date)
+    if end_date is not None:
+        mask &= df['timestamp'] <= to_utc(end_date)
+    if section:
+        mask &= df['studentSection'] == section
+    if not mask.all():
+        df = df[mask].reset_index(drop=True)
+    return df
+
@@ -1,9 +1,14 @@
 import pandas as pd
 import sqlite3
 import os
+import json
+import hashlib
+from dataclasses import dataclass, field
 from datetime import datetime
 from google.cloud import firestore
 from firebase_client import db
+from excel_reader import DEFAULT_CHUNK_SIZE, iter_excel_chunks
+from firestore_writer import FirestoreBulkWriter, iter_document_refs
 
 class ImporterBuilder:
     """ Importer builder class """
@@ -40,6 +45,9 @@ class FirestoreDataImporter(DataImporter):
     
     """
 
+    # Fields needed to place an absence in the report and its statistics
+    ABSENCE_FIELDS = ['lrn', 'timestamp', 'isAbsent', 'studentYear', 'studentSection']
+
     def __init__(self, db_client):
         super().__init__()
         if not db_client:
@@ -59,6 +67,26 @@ class FirestoreDataImporter(DataImporter):
             print(f"Error getting student records: {e}")
             raise
 
+    def import_absences(self, start_date: datetime, end_date: datetime, section: str | None = None):
+        """
+        Gets only the absence records from Firestore for the given date range.
+
+        A field mask limits each document to ABSENCE_FIELDS. This query needs a
+        composite index on (isAbsent, timestamp), plus studentSection when
+        filtering by section.
+        """
+        try:
+            query = self.db.collection('attendance').where('isAbsent', '==', True) \
+                .where('timestamp', '>=', start_date).where('timestamp', '<=', end_date)
+
+            if section:
+                query = query.where('studentSection', '==', section)
+
+            return query.select(self.ABSENCE_FIELDS).get()
+        except Exception as e:
+            print(f"Error getting absence records: {e}")
+            raise
+
     
 
 
@@ -76,11 +104,14 @@ class ExcelDataImporter(DataImporter):
 
 
 
-    def __init__(self, excel_path):
+    MASTER_LIST_COLUMNS = ['LRN', 'LAST_NAME', 'FIRST_NAME', 'STUDENT_YEAR', 'SECTION', 'ADVISER', 'GENDER']
+
+    def __init__(self, excel_path, db_path='master_list.db'):
         super().__init__()
         if not excel_path:
             raise ValueError("An Excel file path is required.")
         self.excel_path = excel_path
+        self.db_path = db_path
     
     def import_data(self, start_date: datetime, end_date: datetime, section: str | None = None):
         pass
@@ -97,9 +128,12 @@ class ExcelDataImporter(DataImporter):
 
         LRN, LAST_NAME, FIRST_NAME, STUDENT_YEAR, SECTION, ADVISER, GENDER
         
+        The file is streamed in chunks, so each chunk is stored as soon as it is read.
+
+        Returns:
+            Number of records imported
         """
-        df = self.parse_excel_file()
-        self.store_master_list(df)
+        return self.store_master_list(self.iter_excel_chunks())
 
     
 
@@ -109,7 +143,7 @@ class ExcelDataImporter(DataImporter):
         df = pd.read_excel(self.excel_path)
         df = df.fillna('')
 
-        valid_columns = ['LRN', 'LAST_NAME', 'FIRST_NAME', 'STUDENT_YEAR', 'SECTION', 'ADVISER', 'GENDER']
+        valid_columns = self.MASTER_LIST_COLUMNS
 
         # validate excel file
         if df is None:
@@ -121,22 +155,60 @@ class ExcelDataImporter(DataImporter):
         
         return df
 
+    # stream the excel file in chunks instead of loading the whole workbook
+    def iter_excel_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Yields the master list in DataFrame chunks of at most chunk_size rows,
+        cleaned the same way as parse_excel_file.
+        """
+        for chunk in iter_excel_chunks(self.excel_path, self.MASTER_LIST_COLUMNS, chunk_size):
+            yield chunk.fillna('')
+
 
 
     # store master list of students in SQLite database
     def store_master_list(self, df):
-        conn = sqlite3.connect('master_list.db')
-        self.create_table(conn)
-
-        for index, row in df.iterrows():
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO master_list (lrn, last_name, first_name, student_year, section, adviser, gender)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (row['LRN'], row['LAST_NAME'], row['FIRST_NAME'], row['STUDENT_YEAR'], row['SECTION'], row['ADVISER'], row['GENDER']))
-            conn.commit()
-        
-        conn.close()
+        """
+        Stores the master list in the SQLite database in a single transaction.
+
+        Accepts either a DataFrame or an iterable of DataFrame chunks (see
+        iter_excel_chunks). Existing students are updated in place, so an
+        updated master list can be re-imported over the old one.
+
+        Returns:
+            Number of records stored
+        """
+        chunks = [df] if isinstance(df, pd.DataFrame) else df
+        record_count = 0
+
+        def rows():
+            nonlocal record_count
+            for chunk in chunks:
+                record_count += len(chunk)
+                yield from chunk[self.MASTER_LIST_COLUMNS].itertuples(index=False, name=None)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            # WAL avoids rewriting the rollback journal on every commit
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.create_table(conn)
+
+            with conn:
+                conn.executemany('''
+                    INSERT INTO master_list (lrn, last_name, first_name, student_year, section, adviser, gender)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(lrn) DO UPDATE SET
+                        last_name = excluded.last_name,
+                        first_name = excluded.first_name,
+                        student_year = excluded.student_year,
+                        section = excluded.section,
+                        adviser = excluded.adviser,
+                        gender = excluded.gender
+                ''', rows())
+        finally:
+            conn.close()
+        return record_count
 
     def upload_master_list_to_firestore(self):
         """
@@ -146,41 +218,28 @@ class ExcelDataImporter(DataImporter):
             print("Error: Firestore client is not initialized.")
             return
 
-        df = self.parse_excel_file()
-        batch = db.batch()
         collection_ref = db.collection('master_list')
-        
-        count = 0
-        BATCH_SIZE = 400 # Firestore batch limit is 500
 
-        print(f"Uploading {len(df)} records to Firestore...")
-
-        for index, row in df.iterrows():
-            # Create a document with LRN as ID
-            doc_ref = collection_ref.document(str(row['LRN']))
-            
-            student_data = {
-                'lrn': str(row['LRN']),
-                'last_name': row['LAST_NAME'],
-                'first_name': row['FIRST_NAME'],
-                'student_year': int(row['STUDENT_YEAR']) if str(row['STUDENT_YEAR']).isdigit() else row['STUDENT_YEAR'],
-                'section': row['SECTION'],
-                'adviser': row['ADVISER'],
-                'gender': row['GENDER']
-            }
-            
-            batch.set(doc_ref, student_data)
-            count += 1
-
-            if count >= BATCH_SIZE:
-                batch.commit()
-                batch = db.batch()
-                count = 0
-                print("Committed batch.")
-
-        if count > 0:
-            batch.commit()
-            print("Committed final batch.")
+        print("Uploading records to Firestore...")
+
+        # Streamed like import_master_list, so the whole workbook is never in memory
+        with FirestoreBulkWriter(db, on_commit=lambda ops: print(f"Committed batch of {len(ops)} records.")) as writer:
+            for chunk in self.iter_excel_chunks():
+                for index, row in chunk.iterrows():
+                    # Create a document with LRN as ID
+                    doc_ref = collection_ref.document(str(row['LRN']))
+
+                    student_data = {
+                        'lrn': str(row['LRN']),
+                        'last_name': row['LAST_NAME'],
+                        'first_name': row['FIRST_NAME'],
+                        'student_year': int(row['STUDENT_YEAR']) if str(row['STUDENT_YEAR']).isdigit() else row['STUDENT_YEAR'],
+                        'section': row['SECTION'],
+                        'adviser': row['ADVISER'],
+                        'gender': row['GENDER']
+                    }
+
+                    writer.set(doc_ref, student_data)
         
         print("Master list upload complete.")
 
@@ -202,6 +261,19 @@ class ExcelDataImporter(DataImporter):
         ''')
         conn.commit()
 
+@dataclass
+class SyncReport:
+    """Summary of a differential master list sync to Firestore."""
+    inserted: list = field(default_factory=list)
+    updated: list = field(default_factory=list)
+    deleted: list = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def total_sent(self) -> int:
+        return len(self.inserted) + len(self.updated) + len(self.deleted)
+
+
 class MasterListManager:
     """
     Manages the master list data in the local SQLite database and Firestore.
@@ -241,50 +313,161 @@ class MasterListManager:
             print("No local records to upload.")
             return 0
 
-        batch = db.batch()
         collection_ref = db.collection('master_list')
-        count = 0
-        BATCH_SIZE = 400
 
         print(f"Uploading {len(records)} records from local DB to Firestore...")
 
-        for record in records:
-            # Ensure data types match what Firestore expects
-            doc_ref = collection_ref.document(str(record['lrn']))
-            
-            # Clean up data if needed (e.g. ensure student_year is int)
-            try:
-                student_year = int(record['student_year'])
-            except (ValueError, TypeError):
-                student_year = record['student_year']
-
-            student_data = {
-                'lrn': str(record['lrn']),
-                'last_name': record['last_name'],
-                'first_name': record['first_name'],
-                'student_year': student_year,
-                'section': record['section'],
-                'adviser': record['adviser'],
-                'gender': record['gender']
-            }
-            
-            batch.set(doc_ref, student_data)
-            count += 1
-
-            if count % BATCH_SIZE == 0:
-                batch.commit()
-                batch = db.batch()
-                if progress_callback:
-                    progress_callback(count)
-                print(f"Committed batch of {BATCH_SIZE} records.")
-
-        if count % BATCH_SIZE != 0:
-            batch.commit()
+        def on_commit(ops):
+            self._mark_synced(student_data_list=[op.data for op in ops])
             if progress_callback:
-                progress_callback(count)
-            print("Committed final batch.")
+                progress_callback(writer.committed)
+            print(f"Committed batch of {len(ops)} records.")
+
+        with FirestoreBulkWriter(db, on_commit=on_commit) as writer:
+            for record in records:
+                # Ensure data types match what Firestore expects
+                doc_ref = collection_ref.document(str(record['lrn']))
+                writer.set(doc_ref, self._to_firestore_record(record))
             
-        return count
+        return writer.committed
+
+    @staticmethod
+    def _to_firestore_record(record):
+        """Converts a local master_list row into the Firestore document data."""
+        # Clean up data if needed (e.g. ensure student_year is int)
+        try:
+            student_year = int(record['student_year'])
+        except (ValueError, TypeError):
+            student_year = record['student_year']
+
+        return {
+            'lrn': str(record['lrn']),
+            'last_name': record['last_name'],
+            'first_name': record['first_name'],
+            'student_year': student_year,
+            'section': record['section'],
+            'adviser': record['adviser'],
+            'gender': record['gender']
+        }
+
+    @staticmethod
+    def _content_hash(student_data):
+        """Hashes the Firestore document data so changed records can be detected."""
+        payload = json.dumps(student_data, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def create_sync_table(self, conn):
+        """Creates the table tracking what was last sent to Firestore per LRN."""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS master_list_sync (
+                lrn TEXT PRIMARY KEY,
+                content_hash TEXT,
+                synced_at TEXT
+            )
+        ''')
+        conn.commit()
+
+    def _mark_synced(self, student_data_list=(), deleted_lrns=()):
+        """Records committed Firestore writes and deletes in the sync table."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.create_sync_table(conn)
+            synced_at = datetime.now().isoformat()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO master_list_sync (lrn, content_hash, synced_at) VALUES (?, ?, ?)",
+                    ((data['lrn'], self._content_hash(data), synced_at) for data in student_data_list)
+                )
+                conn.executemany(
+                    "DELETE FROM master_list_sync WHERE lrn = ?",
+                    ((lrn,) for lrn in deleted_lrns)
+                )
+        finally:
+            conn.close()
+
+    def get_sync_state(self):
+        """Returns a dict of LRN -> content hash of the records last sent to Firestore."""
+        if not os.path.exists(self.db_path):
+            return {}
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.create_sync_table(conn)
+            return dict(conn.execute("SELECT lrn, content_hash FROM master_list_sync"))
+        finally:
+            conn.close()
+
+    def compute_sync_diff(self):
+        """
+        Compares the local master list with what was last sent to Firestore.
+
+        Returns:
+            Tuple of (report, changed) where report is a SyncReport listing the
+            inserted, updated and deleted LRNs, and changed is the list of
+            Firestore document data to write for the inserted and updated LRNs.
+        """
+        synced = self.get_sync_state()
+        report = SyncReport()
+        changed = []
+
+        for record in self.get_local_records():
+            student_data = self._to_firestore_record(record)
+            previous_hash = synced.pop(student_data['lrn'], None)
+
+            if previous_hash is None:
+                report.inserted.append(student_data['lrn'])
+            elif previous_hash != self._content_hash(student_data):
+                report.updated.append(student_data['lrn'])
+            else:
+                report.unchanged += 1
+                continue
+            changed.append(student_data)
+
+        # Whatever was synced before but is no longer in the local list was removed
+        report.deleted = sorted(synced)
+        return report, changed
+
+    def sync_to_firestore(self, progress_callback=None):
+        """
+        Sends only the master list changes since the last sync to Firestore.
+
+        Inserted and updated students are written and removed students are
+        deleted. The sync table is updated after every committed batch, so an
+        interrupted sync resumes where it stopped.
+
+        Returns:
+            SyncReport of the LRNs that were sent
+        """
+        if db is None:
+            raise ConnectionError("Firestore client is not initialized.")
+
+        report, changed = self.compute_sync_diff()
+        if report.total_sent == 0:
+            print(f"Master list already in sync ({report.unchanged} unchanged records).")
+            return report
+
+        collection_ref = db.collection('master_list')
+
+        print(f"Syncing to Firestore: {len(report.inserted)} inserted, "
+              f"{len(report.updated)} updated, {len(report.deleted)} deleted.")
+
+        def on_commit(ops):
+            self._mark_synced(
+                student_data_list=[op.data for op in ops if op.action == 'set'],
+                deleted_lrns=[op.tag for op in ops if op.action == 'delete'],
+            )
+            if progress_callback:
+                progress_callback(writer.committed)
+
+        with FirestoreBulkWriter(db, on_commit=on_commit) as writer:
+            for student_data in changed:
+                writer.set(collection_ref.document(student_data['lrn']), student_data)
+            for lrn in report.deleted:
+                writer.delete(collection_ref.document(lrn), tag=lrn)
+        sent = writer.committed
+
+        print(f"Sync complete. Sent {sent} changes, skipped {report.unchanged} unchanged records.")
+        return report
 
     def delete_local_records(self):
         """Deletes all records from the local SQLite database."""
@@ -311,24 +494,30 @@ class MasterListManager:
             raise ConnectionError("Firestore client is not initialized.")
 
         collection_ref = db.collection('master_list')
-        batch_size = 400
-        deleted = 0
-
-        def delete_batch(docs):
-            batch = db.batch()
-            for doc in docs:
-                batch.delete(doc.reference)
-            batch.commit()
-
-        while True:
-            docs = list(collection_ref.limit(batch_size).stream())
-            if not docs:
-                break
-            
-            delete_batch(docs)
-            deleted += len(docs)
+
+        def on_commit(ops):
             if progress_callback:
-                progress_callback(deleted)
-            print(f"Deleted {len(docs)} records from Firestore.")
-            
-        return deleted
\ No newline at end of file
+                progress_callback(writer.committed)
+            print(f"Deleted {len(ops)} records from Firestore.")
+
+        with FirestoreBulkWriter(db, on_commit=on_commit) as writer:
+            for doc_ref in iter_document_refs(collection_ref):
+                writer.delete(doc_ref)
+        deleted = writer.committed
+
+        # Nothing is left in Firestore, so the next sync must send everything
+        self.clear_sync_state()
+        return deleted
+
+    def clear_sync_state(self):
+        """Forgets what was sent to Firestore, so the next sync sends every record."""
+        if not os.path.exists(self.db_path):
+            return
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.create_sync_table(conn)
+            with conn:
+                conn.execute("DELETE FROM master_list_sync")
+        finally:
+            conn.close()
\ No newline at end of file
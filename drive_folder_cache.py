@@ -0,0 +1,100 @@
+"""
+Persistent cache of Google Drive folder IDs.
+Maps a folder, identified by its parent folder ID and name, to its Drive ID so
+new processes don't have to look every folder up again. Entries are dropped
+when a folder turns out to be trashed or deleted, together with everything
+cached below it.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional
+
+
+class DriveFolderCache:
+    """SQLite-backed folder ID cache, safe to share between upload threads."""
+
+    FILENAME = '.drive_folder_cache.db'
+
+    def __init__(self, db_path: str):
+        """Open (or create) the cache on first use.
+
+        Args:
+            db_path: Path to the cache database
+        """
+        self.db_path = db_path
+        self.conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._path_locks = {}
+
+    @staticmethod
+    def key(folder_name: str, parent_id: Optional[str] = None) -> str:
+        """Cache key of a folder: its parent's ID (or 'root') and its name."""
+        return f"{parent_id or 'root'}/{folder_name}"
+
+    def _connection(self) -> sqlite3.Connection:
+        if self.conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS drive_folders (
+                    folder_key TEXT PRIMARY KEY,
+                    folder_id TEXT NOT NULL,
+                    updated_at TEXT
+                )
+            ''')
+            self.conn.commit()
+        return self.conn
+
+    def lock_for(self, key: str) -> threading.Lock:
+        """Get the lock serializing lookups and creation of one folder."""
+        with self._lock:
+            return self._path_locks.setdefault(key, threading.Lock())
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT folder_id FROM drive_folders WHERE folder_key = ?', (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, folder_id: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO drive_folders (folder_key, folder_id, updated_at) VALUES (?, ?, ?)',
+                    (key, folder_id, datetime.now().isoformat())
+                )
+
+    def invalidate(self, folder_id: str) -> None:
+        """Drop a folder that no longer exists, and every folder cached below it."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                stale = [folder_id]
+                while stale:
+                    current = stale.pop()
+                    conn.execute('DELETE FROM drive_folders WHERE folder_id = ?', (current,))
+                    # Drive IDs may contain '_', so match the key prefix exactly rather than with LIKE
+                    prefix = f"{current}/"
+                    children = conn.execute(
+                        'SELECT folder_id FROM drive_folders WHERE substr(folder_key, 1, ?) = ?', (len(prefix), prefix)
+                    ).fetchall()
+                    conn.execute('DELETE FROM drive_folders WHERE substr(folder_key, 1, ?) = ?', (len(prefix), prefix))
+                    stale.extend(child for child, in children)
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute('DELETE FROM drive_folders')
+
+    def close(self) -> None:
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
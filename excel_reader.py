@@ -0,0 +1,97 @@
+"""
+Streaming reader for large Excel master lists.
+Reads .xlsx workbooks row by row with openpyxl in read-only mode and yields
+the rows as small DataFrame chunks, so memory stays flat for any file size.
+"""
+import os
+from typing import Iterator, List, Optional
+import openpyxl
+import pandas as pd
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def iter_excel_chunks(excel_path: str, required_columns: List[str],
+                      chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Read an Excel file in chunks of rows.
+
+    The header row is validated before any data row is read. Empty cells are
+    returned as None and fully empty rows are skipped. Legacy .xls files cannot
+    be streamed by openpyxl and are read with pandas, then split into chunks.
+
+    Args:
+        excel_path: Path to the Excel file
+        required_columns: Column names that must be present in the header row
+        chunk_size: Maximum number of rows per chunk
+
+    Yields:
+        DataFrames of at most chunk_size rows, with the header row as columns
+
+    Raises:
+        FileNotFoundError: If the Excel file does not exist
+        ValueError: If the file is empty or required columns are missing
+    """
+    if not excel_path or not os.path.isfile(excel_path):
+        raise FileNotFoundError("Excel file not found or not specified.")
+
+    if excel_path.lower().endswith('.xls'):
+        df = pd.read_excel(excel_path)
+        _validate_header(list(df.columns), required_columns)
+        df = df.astype(object).where(df.notna(), None)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size].reset_index(drop=True)
+        return
+
+    workbook = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+
+        header_row = next(rows, None)
+        if header_row is None:
+            raise ValueError("The Excel file is empty.")
+        # Ignore unnamed columns, e.g. stray formatting to the right of the data
+        columns = [(index, str(name).strip()) for index, name in enumerate(header_row) if name is not None]
+        header = [name for _, name in columns]
+        _validate_header(header, required_columns)
+
+        chunk = []
+        for row in rows:
+            values = [row[index] if index < len(row) else None for index, _ in columns]
+            if all(value is None or value == '' for value in values):
+                continue
+            chunk.append(values)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=header, dtype=object)
+                chunk = []
+
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header, dtype=object)
+    finally:
+        # Read-only workbooks keep the file open until closed
+        workbook.close()
+
+
+def count_excel_rows(excel_path: str) -> Optional[int]:
+    """Estimate the number of data rows from the sheet dimensions, for progress reporting.
+
+    Read-only workbooks report their dimensions without reading any rows. The
+    count includes empty rows, which iter_excel_chunks skips.
+
+    Returns:
+        Number of rows below the header, or None for .xls files and sheets
+        without recorded dimensions
+    """
+    if excel_path.lower().endswith('.xls'):
+        return None
+    workbook = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        max_row = workbook.active.max_row
+    finally:
+        workbook.close()
+    return max(max_row - 1, 0) if max_row else None
+
+
+def _validate_header(header: List[str], required_columns: List[str]) -> None:
+    missing_columns = [col for col in required_columns if col not in header]
+    if missing_columns:
+        raise ValueError(f"Missing required columns in Excel file: {', '.join(missing_columns)}")
@@ -0,0 +1,156 @@
+"""
+Bulk write layer for Firestore.
+Groups writes into batches and commits several batches concurrently, retrying
+contended or throttled commits with exponential backoff.
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from google.api_core import exceptions as api_exceptions
+from google.cloud.firestore_v1.field_path import FieldPath
+
+
+@dataclass
+class WriteOp:
+    """A single queued Firestore write."""
+    action: str  # 'set' or 'delete'
+    doc_ref: Any
+    data: Optional[Dict[str, Any]] = None
+    tag: Any = None  # Caller-defined identifier, handed back in on_commit
+
+
+class FirestoreBulkWriter:
+    """
+    Commits Firestore writes in batches with a bounded number of commits in flight.
+
+    Args:
+        db_client: A valid Firestore database client
+        batch_size: Writes per batch (Firestore allows at most 500)
+        max_in_flight: Maximum number of batches being committed at once
+        max_retries: Retries per batch for contention and throttling errors
+        backoff_base: Initial retry delay in seconds, doubled on every retry
+        on_commit: Optional callback receiving the list of WriteOps of each
+            committed batch. It always runs on the thread that queues writes.
+    """
+
+    # Errors Firestore raises for contention, throttling and transient outages
+    RETRYABLE_ERRORS = (
+        api_exceptions.Aborted,
+        api_exceptions.DeadlineExceeded,
+        api_exceptions.InternalServerError,
+        api_exceptions.ResourceExhausted,
+        api_exceptions.ServiceUnavailable,
+        api_exceptions.TooManyRequests,
+    )
+
+    def __init__(self, db_client, batch_size: int = 400, max_in_flight: int = 4, max_retries: int = 5,
+                 backoff_base: float = 0.5, on_commit: Optional[Callable[[List[WriteOp]], None]] = None):
+        if not db_client:
+            raise ValueError("A valid Firestore database client is required.")
+        self.db = db_client
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.on_commit = on_commit
+        self.committed = 0  # Number of writes committed so far
+
+        self._ops: List[WriteOp] = []
+        self._in_flight = {}  # Future -> list of WriteOps
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight)
+
+    def set(self, doc_ref, data: Dict[str, Any], tag: Any = None) -> None:
+        """Queues a document write."""
+        self._add(WriteOp('set', doc_ref, data, tag))
+
+    def delete(self, doc_ref, tag: Any = None) -> None:
+        """Queues a document delete."""
+        self._add(WriteOp('delete', doc_ref, None, tag))
+
+    def flush(self) -> None:
+        """Commits all queued writes and waits for every batch to finish."""
+        if self._ops:
+            self._submit()
+        while self._in_flight:
+            self._collect(ALL_COMPLETED)
+
+    def close(self) -> None:
+        """Flushes the queued writes and shuts down the commit pool."""
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'FirestoreBulkWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # Don't commit half of a failed run; let in-flight batches finish
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _add(self, op: WriteOp) -> None:
+        self._ops.append(op)
+        if len(self._ops) >= self.batch_size:
+            self._submit()
+
+    def _submit(self) -> None:
+        ops, self._ops = self._ops, []
+        # Bound the number of concurrent commits
+        while len(self._in_flight) >= self.max_in_flight:
+            self._collect(FIRST_COMPLETED)
+        self._in_flight[self._executor.submit(self._commit, ops)] = ops
+
+    def _collect(self, return_when) -> None:
+        done, _ = wait(list(self._in_flight), return_when=return_when)
+        for future in done:
+            ops = self._in_flight.pop(future)
+            future.result()  # Re-raises a commit that failed after all retries
+            self.committed += len(ops)
+            if self.on_commit:
+                self.on_commit(ops)
+
+    def _commit(self, ops: List[WriteOp]) -> None:
+        for attempt in range(self.max_retries + 1):
+            # A fresh batch per attempt, as a failed batch can't be reused safely
+            batch = self.db.batch()
+            for op in ops:
+                if op.action == 'set':
+                    batch.set(op.doc_ref, op.data)
+                else:
+                    batch.delete(op.doc_ref)
+            try:
+                batch.commit()
+                return
+            except self.RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_base * (2 ** attempt) + random.uniform(0, self.backoff_base)
+                print(f"Batch commit failed ({e.__class__.__name__}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+
+def iter_document_refs(collection_ref, page_size: int = 400) -> Iterator[Any]:
+    """
+    Streams every document reference in a collection using cursor pagination.
+
+    Each page projects only the document ID (an empty projection would return
+    every field), so only document names are transferred, and the next page
+    starts after the last document of the previous one. Documents may be
+    deleted while iterating.
+    """
+    query = collection_ref.select([FieldPath.document_id()]).order_by(FieldPath.document_id()).limit(page_size)
+    last_doc = None
+
+    while True:
+        page_query = query.start_after(last_doc) if last_doc is not None else query
+        docs = list(page_query.stream())
+        for doc in docs:
+            yield doc.reference
+        if len(docs) < page_size:
+            break
+        last_doc = docs[-1]
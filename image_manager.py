@@ -1,19 +1,180 @@
 import os
+import hashlib
+import json
+import random
+import threading
+import time
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 from google.oauth2 import service_account
 import pickle
+from drive_folder_cache import DriveFolderCache
+from image_normalizer import ImageNormalizer
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# Drive answers rate limiting and transient outages with these statuses
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+MAX_BATCH_SIZE = 100  # Drive accepts at most 100 calls in one batch request
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+
+def execute_with_retry(request, max_retries: int = 5, backoff_base: float = 1.0):
+    """
+    Executes a Drive API request, retrying rate-limited and transient failures
+    with exponential backoff. A resumable upload continues its upload session
+    on each retry instead of starting over.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return request.execute()
+        except (HttpError, ConnectionError, TimeoutError) as e:
+            status = e.resp.status if isinstance(e, HttpError) else None
+            if (isinstance(e, HttpError) and status not in RETRYABLE_STATUSES) or attempt == max_retries:
+                raise
+            delay = backoff_base * (2 ** attempt) + random.uniform(0, backoff_base)
+            print(f"Drive request failed ({status or e.__class__.__name__}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+def execute_batch(service, requests: Dict[str, object], max_retries: int = 5, backoff_base: float = 1.0,
+                  batch_size: int = MAX_BATCH_SIZE) -> Dict[str, object]:
+    """
+    Executes Drive API requests in batch requests of up to batch_size calls.
+    Calls that fail with a retryable status are sent again in a later batch,
+    with exponential backoff; other failures are returned in place of a result.
+
+    Args:
+        service: Drive service the requests were built with
+        requests: Mapping of request ID to an unexecuted request
+
+    Returns:
+        Mapping of each request ID to its response, or the HttpError it failed with
+    """
+    results = {}
+    pending = dict(requests)
+    for attempt in range(max_retries + 1):
+        retry = {}
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+            elif (isinstance(exception, HttpError) and exception.resp.status in RETRYABLE_STATUSES
+                  and attempt < max_retries):
+                retry[request_id] = pending[request_id]
+            else:
+                results[request_id] = exception
+
+        request_ids = list(pending)
+        for start in range(0, len(request_ids), batch_size):
+            batch = service.new_batch_http_request(callback=callback)
+            for request_id in request_ids[start:start + batch_size]:
+                batch.add(pending[request_id], request_id=request_id)
+            # A failure of the batch request itself is retried as a whole
+            execute_with_retry(batch, max_retries, backoff_base)
+
+        if not retry:
+            break
+        delay = backoff_base * (2 ** attempt) + random.uniform(0, backoff_base)
+        print(f"{len(retry)} batched Drive requests failed, retrying in {delay:.1f}s...")
+        time.sleep(delay)
+        pending = retry
+    return results
+
+
+def _batch_result(results: Dict[str, object], request_id: str):
+    """Gets one response of execute_batch, raising the error the call failed with."""
+    result = results[request_id]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+@dataclass
+class UploadReport:
+    """Outcome of an upload run."""
+    uploaded: int = 0
+    replaced: int = 0
+    skipped: int = 0
+    failed: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+class UploadSessionLog:
+    """
+    Append-only log of the files uploaded by an interrupted or partly failed
+    run, so the next run continues where it stopped. A file is uploaded again
+    if its size or modification time changed since it was logged, or if it was
+    logged with different normalization settings (variant). The log is
+    removed once a run completes without failures, after which files are
+    checked against Drive itself.
+    """
+    FILENAME = '.drive_upload_session.jsonl'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A line cut off by an interrupted run
+                    self.entries[entry['path']] = entry
+
+    @staticmethod
+    def _stat(local_path: str) -> Dict[str, int]:
+        stat = os.stat(local_path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def is_done(self, relative_path: str, local_path: str, variant: str = '') -> bool:
+        entry = self.entries.get(relative_path)
+        if entry is None or entry.get('variant', '') != variant:
+            return False
+        current = self._stat(local_path)
+        return entry['size'] == current['size'] and entry['mtime_ns'] == current['mtime_ns']
+
+    def record(self, relative_path: str, local_path: str, file_id: str, variant: str = '') -> None:
+        entry = {'path': relative_path, 'file_id': file_id, 'variant': variant, **self._stat(local_path)}
+        self.entries[relative_path] = entry
+        # Written right away so a crash loses at most the uploads in flight
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def clear(self) -> None:
+        self.entries = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
 
 class DriveImageManager:
     """
     Manages image uploads to Google Drive.
     """
-    def __init__(self, images_dir="images", credentials_file="credentials.json", token_file="token.pickle"):
+    def __init__(self, images_dir="images", credentials_file="credentials.json", token_file="token.pickle",
+                 max_workers: int = 4, max_retries: int = 5, backoff_base: float = 1.0,
+                 service_factory: Optional[Callable[[], object]] = None, folder_cache_path: Optional[str] = None,
+                 normalizer: Optional[ImageNormalizer] = None):
         self.images_dir = images_dir
         self.credentials_file = credentials_file
         self.token_file = token_file
         self.service = None
-        self.folder_cache = {} # Cache folder IDs to avoid repeated API calls
+        # Folder IDs persist across runs; each cached ID is checked once per run before it's trusted
+        self.folder_cache = DriveFolderCache(folder_cache_path or os.path.join(images_dir, DriveFolderCache.FILENAME))
+        self._validated_folders = set()
+        # When set, photos are resized and re-encoded before upload
+        self.normalizer = normalizer
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        # Builds a Drive service; each upload thread gets its own because httplib2 isn't thread-safe
+        self.service_factory = service_factory
+        self._thread_local = threading.local()
 
     def authenticate(self):
         """
@@ -21,6 +182,11 @@ class DriveImageManager:
         Prioritizes Service Account if credentials.json is a service account key.
         Otherwise falls back to OAuth flow (simplified here).
         """
+        if self.service_factory is not None:
+            self.service = self.service_factory()
+            self._thread_local.service = self.service
+            return
+
         try:
             # Check if we have a service account file
             if os.path.exists(self.credentials_file):
@@ -30,51 +196,287 @@ class DriveImageManager:
                     self.credentials_file, scopes=['https://www.googleapis.com/auth/drive']
                 )
                 self.service = build('drive', 'v3', credentials=self.creds)
+                self.service_factory = lambda: build('drive', 'v3', credentials=self.creds)
+                self._thread_local.service = self.service
                 print("Authenticated with Google Drive (Service Account).")
             else:
                 print(f"Warning: Credentials file '{self.credentials_file}' not found.")
         except Exception as e:
             print(f"Authentication failed: {e}")
 
+    def _thread_service(self):
+        """Gets the Drive service of the calling upload thread, building it on first use."""
+        service = getattr(self._thread_local, 'service', None)
+        if service is None:
+            service = self.service_factory()
+            self._thread_local.service = service
+        return service
+
+    def _execute(self, request):
+        return execute_with_retry(request, self.max_retries, self.backoff_base)
+
+    def _execute_batch(self, requests: Dict[str, object]) -> Dict[str, object]:
+        return execute_batch(self.service, requests, self.max_retries, self.backoff_base)
+
+    @staticmethod
+    def _folder_query(folder_name, parent_id=None) -> str:
+        query = f"name = '{folder_name}' and mimeType = '{FOLDER_MIME_TYPE}' and trashed = false"
+        if parent_id:
+            query += f" and '{parent_id}' in parents"
+        return query
+
+    @staticmethod
+    def _folder_metadata(folder_name, parent_id=None) -> Dict:
+        file_metadata = {
+            'name': folder_name,
+            'mimeType': FOLDER_MIME_TYPE
+        }
+        if parent_id:
+            file_metadata['parents'] = [parent_id]
+        return file_metadata
+
+    def _folder_exists(self, folder_id, service) -> bool:
+        """Checks that a cached folder ID still points at a folder that isn't trashed."""
+        try:
+            folder = self._execute(service.files().get(fileId=folder_id, fields='id, trashed'))
+        except HttpError as e:
+            if e.resp.status == 404:
+                return False
+            raise
+        return not folder.get('trashed', False)
+
     def get_folder_id(self, folder_name, parent_id=None):
         """
         Finds or creates a folder in Drive.
+        Safe to call from several upload threads: lookups of the same folder
+        are serialized, so a missing folder is only created once.
         """
         if not self.service:
             return None
 
-        cache_key = f"{parent_id}_{folder_name}"
-        if cache_key in self.folder_cache:
-            return self.folder_cache[cache_key]
+        cache_key = DriveFolderCache.key(folder_name, parent_id)
+        with self.folder_cache.lock_for(cache_key):
+            service = self._thread_service()
+            folder_id = self.folder_cache.get(cache_key)
+            if folder_id is not None:
+                if folder_id in self._validated_folders:
+                    return folder_id
+                if self._folder_exists(folder_id, service):
+                    self._validated_folders.add(folder_id)
+                    return folder_id
+                print(f"Cached folder '{folder_name}' (ID: {folder_id}) was trashed or deleted. Looking it up again.")
+                self.folder_cache.invalidate(folder_id)
 
-        query = f"name = '{folder_name}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-        if parent_id:
-            query += f" and '{parent_id}' in parents"
-        
-        results = self.service.files().list(q=query, fields="files(id, name)").execute()
-        files = results.get('files', [])
+            query = self._folder_query(folder_name, parent_id)
+            results = self._execute(service.files().list(q=query, fields="files(id, name)"))
+            files = results.get('files', [])
 
-        if files:
-            folder_id = files[0]['id']
-        else:
-            # Create folder
-            file_metadata = {
-                'name': folder_name,
-                'mimeType': 'application/vnd.google-apps.folder'
-            }
-            if parent_id:
-                file_metadata['parents'] = [parent_id]
-            
-            folder = self.service.files().create(body=file_metadata, fields='id').execute()
-            folder_id = folder.get('id')
-            print(f"Created folder '{folder_name}' (ID: {folder_id})")
+            if files:
+                folder_id = files[0]['id']
+            else:
+                # Create folder
+                file_metadata = self._folder_metadata(folder_name, parent_id)
+                folder = self._execute(service.files().create(body=file_metadata, fields='id'))
+                folder_id = folder.get('id')
+                print(f"Created folder '{folder_name}' (ID: {folder_id})")
 
-        self.folder_cache[cache_key] = folder_id
-        return folder_id
+            self.folder_cache.set(cache_key, folder_id)
+            self._validated_folders.add(folder_id)
+            return folder_id
 
-    def upload_images(self):
+    def resolve_folder_tree(self, folder_paths: Iterable[Tuple[str, ...]]) -> Dict[Tuple[str, ...], str]:
+        """
+        Finds or creates a tree of folders, one level at a time. The checks of
+        cached IDs, the lookups and the creations of a level are each sent as
+        batch requests, so a whole section tree takes a few requests per level
+        instead of a few per folder.
+
+        Args:
+            folder_paths: Folder paths from the Drive root, as tuples of folder names
+
+        Returns:
+            Mapping of each path, and each of its ancestors, to its folder ID
+        """
+        paths = {path[:depth] for path in folder_paths for depth in range(1, len(path) + 1)}
+        folder_ids = {(): None}
+        for depth in range(1, max(map(len, paths), default=0) + 1):
+            level = {}  # Cache key -> (folder name, parent ID)
+            keys = {}
+            for path in sorted(p for p in paths if len(p) == depth):
+                parent_id = folder_ids[path[:-1]]
+                keys[path] = DriveFolderCache.key(path[-1], parent_id)
+                level[keys[path]] = (path[-1], parent_id)
+
+            with ExitStack() as stack:
+                # Same locks as get_folder_id, taken in a fixed order
+                for key in sorted(level):
+                    stack.enter_context(self.folder_cache.lock_for(key))
+                resolved = self._resolve_folder_level(level)
+            folder_ids.update((path, resolved[key]) for path, key in keys.items())
+
+        del folder_ids[()]
+        return folder_ids
+
+    def _resolve_folder_level(self, level: Dict[str, Tuple[str, Optional[str]]]) -> Dict[str, str]:
+        """Finds or creates sibling-level folders with one batch per kind of call."""
+        resolved = {}
+
+        # Cached IDs not checked yet in this run are checked together
+        unchecked = {}
+        for key in level:
+            folder_id = self.folder_cache.get(key)
+            if folder_id is None:
+                continue
+            if folder_id in self._validated_folders:
+                resolved[key] = folder_id
+            else:
+                unchecked[key] = folder_id
+        if unchecked:
+            results = self._execute_batch({
+                key: self.service.files().get(fileId=folder_id, fields='id, trashed')
+                for key, folder_id in unchecked.items()
+            })
+            for key, folder_id in unchecked.items():
+                result = results[key]
+                if isinstance(result, HttpError) and result.resp.status == 404:
+                    exists = False
+                else:
+                    exists = not _batch_result(results, key).get('trashed', False)
+                if not exists:
+                    print(f"Cached folder '{level[key][0]}' (ID: {folder_id}) was trashed or deleted. "
+                          f"Looking it up again.")
+                    self.folder_cache.invalidate(folder_id)
+                    continue
+                resolved[key] = folder_id
+                self._validated_folders.add(folder_id)
+
+        missing = [key for key in level if key not in resolved]
+        if missing:
+            results = self._execute_batch({
+                key: self.service.files().list(q=self._folder_query(*level[key]), fields="files(id, name)")
+                for key in missing
+            })
+            to_create = []
+            for key in missing:
+                files = _batch_result(results, key).get('files', [])
+                if files:
+                    resolved[key] = files[0]['id']
+                else:
+                    to_create.append(key)
+
+            if to_create:
+                results = self._execute_batch({
+                    key: self.service.files().create(body=self._folder_metadata(*level[key]), fields='id')
+                    for key in to_create
+                })
+                for key in to_create:
+                    resolved[key] = _batch_result(results, key).get('id')
+                    print(f"Created folder '{level[key][0]}' (ID: {resolved[key]})")
+
+            for key in missing:
+                self.folder_cache.set(key, resolved[key])
+                self._validated_folders.add(resolved[key])
+        return resolved
+
+    def list_folder(self, parent_id, service=None) -> Dict[str, Dict]:
+        """
+        Lists every file in a Drive folder with one paginated query.
+
+        Returns:
+            Mapping of file name to its id, name, md5Checksum and size
+        """
+        service = service or self.service
+        index = {}
+        page_token = None
+        while True:
+            results = self._execute(self._list_request(service, parent_id, page_token))
+            self._add_to_index(index, results)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return index
+
+    def list_folders(self, parent_ids: Iterable[str]) -> Dict[str, Dict[str, Dict]]:
+        """
+        Lists several Drive folders, fetching one page of each folder per batch request.
+
+        Returns:
+            Mapping of folder ID to its listing, as returned by list_folder
+        """
+        indexes = {parent_id: {} for parent_id in parent_ids}
+        page_tokens = {parent_id: None for parent_id in indexes}
+        while page_tokens:
+            results = self._execute_batch({
+                parent_id: self._list_request(self.service, parent_id, page_token)
+                for parent_id, page_token in page_tokens.items()
+            })
+            page_tokens = {}
+            for parent_id in results:
+                page = _batch_result(results, parent_id)
+                self._add_to_index(indexes[parent_id], page)
+                if page.get('nextPageToken'):
+                    page_tokens[parent_id] = page['nextPageToken']
+        return indexes
+
+    @staticmethod
+    def _list_request(service, parent_id, page_token=None):
+        return service.files().list(
+            q=f"'{parent_id}' in parents and trashed = false",
+            fields="nextPageToken, files(id, name, md5Checksum, size)",
+            pageSize=1000,
+            pageToken=page_token,
+        )
+
+    @staticmethod
+    def _add_to_index(index: Dict[str, Dict], page: Dict) -> None:
+        for file in page.get('files', []):
+            # Keep the first of duplicate names, as a name lookup would
+            index.setdefault(file['name'], file)
+
+    @staticmethod
+    def _file_md5(local_path) -> str:
+        md5 = hashlib.md5()
+        with open(local_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                md5.update(block)
+        return md5.hexdigest()
+
+    def _upload_file(self, local_path, file_name, parent_id, existing_id=None):
+        """
+        Uploads one file with the calling thread's Drive service.
+        An existing Drive file is replaced in place, keeping its ID.
+
+        Returns:
+            The Drive file ID
+        """
+        service = self._thread_service()
+        media = MediaFileUpload(local_path, resumable=True)
+
+        if existing_id:
+            # The name is set too, so an original-format copy is renamed to the normalized name
+            updated = self._execute(service.files().update(
+                fileId=existing_id, body={'name': file_name}, media_body=media, fields='id'
+            ))
+            return updated.get('id', existing_id)
+
+        # Upload file
+        file_metadata = {'name': file_name, 'parents': [parent_id]}
+        created = self._execute(service.files().create(body=file_metadata, media_body=media, fields='id'))
+        return created.get('id')
+
+    def upload_images(self, max_workers: Optional[int] = None) -> Optional[UploadReport]:
         """
         Uploads images to Google Drive, maintaining folder structure.
+        Files are uploaded concurrently by max_workers threads, and files
+        logged as uploaded by an earlier run are skipped.
+
+        Each target folder is listed once, and files are skipped, uploaded or
+        replaced by comparing their MD5 with the Drive copy. Folder lookups,
+        creations and listings are sent as batch requests, so the number of
+        metadata requests grows with the depth of the folder tree, not the
+        number of folders or files.
+
+        With a normalizer, the normalized copy of each photo is uploaded instead,
+        named after the source with the normalized extension (e.g. 123.png -> 123.jpg).
         """
         if not self.service:
             self.authenticate()
@@ -87,44 +489,129 @@ class DriveImageManager:
             return
 
         print(f"Scanning '{self.images_dir}' for images...")
-        
+
         # Root folder for uploads
         root_folder_name = "Chronos_Images"
-        root_id = self.get_folder_id(root_folder_name)
+
+        session = UploadSessionLog(os.path.join(self.images_dir, UploadSessionLog.FILENAME))
+        # Files logged without normalization, or with other settings, are uploaded again
+        variant = self.normalizer.signature() if self.normalizer is not None else ''
+        report = UploadReport()
+        by_folder = {}  # Drive folder path -> [(local_path, relative_file, file)]
 
         for root, dirs, files in os.walk(self.images_dir):
+            # Skip hidden directories such as a normalization cache kept inside the images directory
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
             for file in files:
-                if file.lower().endswith(('.png', '.jpg', '.jpeg')):
+                if file.lower().endswith(IMAGE_EXTENSIONS):
                     local_path = os.path.join(root, file)
-                    
+                    relative_file = os.path.relpath(local_path, self.images_dir)
+                    if session.is_done(relative_file, local_path, variant):
+                        report.skipped += 1
+                        continue
+
                     # Determine parent folder in Drive based on local structure
                     # e.g. images/SectionA/student.jpg -> Drive/Chronos_Images/SectionA/student.jpg
-                    
+
                     relative_path = os.path.relpath(root, self.images_dir)
-                    current_parent_id = root_id
-                    
+                    folder_path = (root_folder_name,)
                     if relative_path != ".":
-                        # Create/Find subfolders
-                        parts = relative_path.split(os.sep)
-                        for part in parts:
-                            current_parent_id = self.get_folder_id(part, current_parent_id)
-                    
-                    # Check if file exists
-                    query = f"name = '{file}' and '{current_parent_id}' in parents and trashed = false"
-                    results = self.service.files().list(q=query, fields="files(id)").execute()
-                    if results.get('files'):
-                        print(f"Skipping {file} (already exists).")
-                        continue
+                        folder_path += tuple(relative_path.split(os.sep))
 
-                    # Upload file
-                    file_metadata = {'name': file, 'parents': [current_parent_id]}
-                    media = MediaFileUpload(local_path, resumable=True)
-                    
-                    print(f"Uploading {local_path}...")
-                    self.service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+                    by_folder.setdefault(folder_path, []).append((local_path, relative_file, file))
+
+        if report.skipped:
+            print(f"Skipping {report.skipped} images uploaded by an earlier run.")
+
+        # Create/Find the folders of every pending file together
+        folder_ids = self.resolve_folder_tree(by_folder)
+        pending = {}  # Drive folder ID -> [(local_path, relative_file, file)]
+        for folder_path, folder_files in by_folder.items():
+            pending.setdefault(folder_ids[folder_path], []).extend(folder_files)
+
+        normalized = {}
+        if self.normalizer is not None:
+            sources = [local_path for folder_files in pending.values() for local_path, _, _ in folder_files]
+            print(f"Normalizing {len(sources)} images...")
+            normalized = self.normalizer.normalize_many(sources)
+
+        # Decide what to do with each file against one listing per folder
+        tasks = []
+        superseded = []  # IDs of original-format copies on Drive replaced by a normalized copy
+        listings = self.list_folders(pending)
+        for parent_id, folder_files in pending.items():
+            remote = listings[parent_id]
+            for local_path, relative_file, file in folder_files:
+                # Photos that couldn't be normalized are uploaded as they are
+                upload_path = normalized.get(local_path) or local_path
+                original = remote.get(file)
+                if upload_path != local_path:
+                    file = os.path.splitext(file)[0] + os.path.splitext(upload_path)[1]
+                    if original is not None and original['name'] == file:
+                        original = None
+
+                existing = remote.get(file)
+                if original is not None and original is not existing:
+                    if existing is None:
+                        # Replace the original-format copy in place, keeping its file ID
+                        existing = original
+                    else:
+                        superseded.append(original['id'])
+
+                if existing is None:
+                    tasks.append((local_path, upload_path, relative_file, file, parent_id, None))
+                elif existing['name'] == file and existing.get('md5Checksum') == self._file_md5(upload_path):
+                    session.record(relative_file, local_path, existing['id'], variant)
+                    report.skipped += 1
+                    print(f"Skipping {file} (already exists).")
+                else:
+                    tasks.append((local_path, upload_path, relative_file, file, parent_id, existing['id']))
+
+        if superseded:
+            # Trashed rather than deleted, so they can still be restored from Drive
+            results = self._execute_batch({
+                file_id: self.service.files().update(fileId=file_id, body={'trashed': True}, fields='id')
+                for file_id in superseded
+            })
+            failed = [file_id for file_id, result in results.items() if isinstance(result, Exception)]
+            print(f"Trashed {len(superseded) - len(failed)} original images superseded by normalized copies.")
+            for file_id in failed:
+                print(f"Failed to trash {file_id}: {results[file_id]}")
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            futures = {
+                executor.submit(self._upload_file, upload_path, file, parent_id, existing_id):
+                    (local_path, relative_file, file, existing_id)
+                for local_path, upload_path, relative_file, file, parent_id, existing_id in tasks
+            }
+            for future in as_completed(futures):
+                local_path, relative_file, file, existing_id = futures[future]
+                try:
+                    file_id = future.result()
+                except Exception as e:
+                    report.failed += 1
+                    report.errors.append(f"{relative_file}: {e}")
+                    print(f"Failed to upload {local_path}: {e}")
+                    continue
+
+                session.record(relative_file, local_path, file_id, variant)
+                if existing_id:
+                    report.replaced += 1
+                    print(f"Replaced {file} (changed locally).")
+                else:
+                    report.uploaded += 1
                     print(f"Uploaded {file}.")
 
-        print("Image upload complete.")
+        if report.failed:
+            print("Keeping the upload session log so the next run only retries the failed images.")
+        else:
+            # Nothing left to resume; later runs compare against Drive, so files
+            # trashed or changed on Drive are uploaded again
+            session.clear()
+
+        print(f"Image upload complete: {report.uploaded} uploaded, {report.replaced} replaced, "
+              f"{report.skipped} skipped, {report.failed} failed.")
+        return report
 
 if __name__ == "__main__":
     manager = DriveImageManager()
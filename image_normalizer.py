@@ -0,0 +1,141 @@
+"""
+Normalization of student photos before they are uploaded to Drive.
+Each photo is rotated upright from its EXIF orientation, shrunk to a maximum
+dimension, stripped of metadata and re-encoded as a progressive JPEG or a
+WebP. Results are stored in a cache directory under the hash of the source
+file and the settings, so unchanged photos are only processed once.
+"""
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+from PIL import Image, ImageOps
+
+# Output format -> file extension
+OUTPUT_EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+
+
+class ImageNormalizer:
+    """Re-encodes photos into a content-addressed cache directory."""
+
+    def __init__(self, cache_dir: str = '.image_cache', max_dimension: int = 512, output_format: str = 'JPEG',
+                 quality: int = 80, workers: Optional[int] = None):
+        """
+        Args:
+            cache_dir: Directory the normalized images are written to
+            max_dimension: Longest side of a normalized image, in pixels
+            output_format: 'JPEG' (progressive) or 'WEBP'
+            quality: Encoder quality, 1-100
+            workers: Number of worker processes. None uses all CPU cores, 1 runs serially.
+
+        Raises:
+            ValueError: If the output format is not supported
+        """
+        output_format = output_format.upper()
+        if output_format not in OUTPUT_EXTENSIONS:
+            raise ValueError(f"Unsupported output format: {output_format}. Use one of {', '.join(OUTPUT_EXTENSIONS)}.")
+        self.cache_dir = cache_dir
+        self.max_dimension = max_dimension
+        self.output_format = output_format
+        self.quality = quality
+        self.workers = workers
+
+    @property
+    def extension(self) -> str:
+        return OUTPUT_EXTENSIONS[self.output_format]
+
+    def settings(self) -> Dict[str, Any]:
+        """Settings needed to rebuild this normalizer in a worker process."""
+        return {
+            'cache_dir': self.cache_dir,
+            'max_dimension': self.max_dimension,
+            'output_format': self.output_format,
+            'quality': self.quality,
+            'workers': 1,
+        }
+
+    def signature(self) -> str:
+        """Identifies the settings that affect the normalized images."""
+        return f"{self.max_dimension}/{self.output_format}/{self.quality}"
+
+    def cache_path(self, source_path: str) -> str:
+        """Path of the normalized copy of a source image, from its content and the settings."""
+        digest = hashlib.sha256()
+        # Changing a setting must not reuse images normalized with the old one
+        digest.update(f"{self.signature()}/".encode())
+        with open(source_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return os.path.join(self.cache_dir, digest.hexdigest() + self.extension)
+
+    def normalize(self, source_path: str) -> str:
+        """
+        Normalize one image, reusing the cached copy if there is one.
+
+        Returns:
+            Path of the normalized image
+        """
+        target_path = self.cache_path(source_path)
+        if os.path.exists(target_path):
+            return target_path
+
+        with Image.open(source_path) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'L'):
+                # Flatten transparency onto white; neither output keeps an alpha channel
+                background = Image.new('RGB', img.size, 'white')
+                rgba = img.convert('RGBA')
+                background.paste(rgba, mask=rgba.getchannel('A'))
+                img = background
+            img.thumbnail((self.max_dimension, self.max_dimension), Image.Resampling.LANCZOS)
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Written under a temporary name so an interrupted run never leaves a partial image in the cache
+            temp_path = f"{target_path}.{os.getpid()}.tmp"
+            # No exif or icc_profile is passed, so the metadata of the source is dropped
+            if self.output_format == 'JPEG':
+                img.save(temp_path, 'JPEG', quality=self.quality, optimize=True, progressive=True)
+            else:
+                img.save(temp_path, 'WEBP', quality=self.quality, method=6)
+        os.replace(temp_path, target_path)
+        return target_path
+
+    def normalize_many(self, source_paths: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Normalize images in a process pool.
+
+        Returns:
+            Mapping of each source path to its normalized path, or None if it couldn't be read
+        """
+        workers = self.workers or os.cpu_count() or 1
+        if workers <= 1 or len(source_paths) <= 1:
+            return {path: _normalize_or_none(self, path) for path in source_paths}
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_normalize_worker,
+                                 initargs=(self.settings(),)) as executor:
+            results = executor.map(_normalize_in_worker, source_paths,
+                                   chunksize=max(1, len(source_paths) // (workers * 4)))
+            return dict(zip(source_paths, results))
+
+
+def _normalize_or_none(normalizer: ImageNormalizer, source_path: str) -> Optional[str]:
+    try:
+        return normalizer.normalize(source_path)
+    except (OSError, ValueError) as e:
+        # PIL raises OSError subclasses for unreadable and truncated images
+        print(f"Could not normalize {source_path}: {e}")
+        return None
+
+
+# Per-process normalizer used by the pool workers
+_worker_normalizer: Optional[ImageNormalizer] = None
+
+
+def _init_normalize_worker(settings: Dict[str, Any]) -> None:
+    """Initialize the normalizer for a worker process."""
+    global _worker_normalizer
+    _worker_normalizer = ImageNormalizer(**settings)
+
+
+def _normalize_in_worker(source_path: str) -> Optional[str]:
+    return _normalize_or_none(_worker_normalizer, source_path)
@@ -1,6 +1,7 @@
 import os
 import base64
 from firebase_client import db
+from qr_crypto import QRKeyring
 
 class KeyManager:
     """
@@ -74,6 +75,57 @@ class KeyManager:
         except Exception as e:
             print(f"Error retrieving key: {e}")
 
+    def upload_keyring(self, keyring: QRKeyring):
+        """
+        Uploads every key of a keyring to Firestore (config/secrets).
+        The active key is also stored as 'encryption_key' for scanners that
+        only know a single key.
+        """
+        if db is None:
+            print("Error: Firestore client is not initialized.")
+            return
+
+        try:
+            doc_ref = db.collection('config').document('secrets')
+            doc_ref.set({
+                'encryption_key': keyring.active.get_key_base64(),
+                'keyring': keyring.to_dict(),
+            }, merge=True)
+
+            print(f"Keyring with {len(keyring.key_ids)} keys uploaded to Firestore (config/secrets).")
+
+        except Exception as e:
+            print(f"Error uploading keyring: {e}")
+
+    def retrieve_keyring(self):
+        """
+        Retrieves the keyring from Firestore.
+        If only a single key has been uploaded, it becomes key ID 0.
+        """
+        if db is None:
+            print("Error: Firestore client is not initialized.")
+            return None
+
+        try:
+            doc = db.collection('config').document('secrets').get()
+
+            if not doc.exists:
+                print("Error: Secrets document not found in Firestore.")
+                return None
+
+            data = doc.to_dict()
+            if data.get('keyring'):
+                return QRKeyring.from_dict(data['keyring'])
+            if data.get('encryption_key'):
+                return QRKeyring({0: base64.b64decode(data['encryption_key'])})
+
+            print("Error: No keys found in secrets document.")
+            return None
+
+        except Exception as e:
+            print(f"Error retrieving keyring: {e}")
+            return None
+
 if __name__ == "__main__":
     manager = KeyManager()
     # manager.upload_key() # Uncomment to upload
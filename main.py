@@ -3,10 +3,13 @@ from tkinter import ttk, filedialog, messagebox, simpledialog
 import os
 import base64
 from qr_generator import QRCodeGenerator
+from qr_manifest import QRManifest
+from excel_reader import count_excel_rows
 from qr_crypto import QRCodeCrypto
 import threading
 from datetime import datetime, timedelta
 from report_generator import ExcelReportGenerator
+from attendance_cache import AttendanceCache
 
 # Import the Firestore database client
 # This line executes the initialization code in firebase_client.py
@@ -338,12 +341,10 @@ The Excel file must contain columns with the following headers (order does not m
             self._log_import(f"Reading data from: {os.path.basename(file_path)}")
             importer = ImporterBuilder(file_path).build()
             
-            self._log_import("Parsing Excel file...")
-            df = importer.parse_excel_file()
-            self._log_import(f"Found {len(df)} records in the file.")
-
+            # The file is streamed into the local database chunk by chunk
             self._log_import("Storing data into the local database... (This may take a moment)")
-            importer.store_master_list(df)
+            record_count = importer.import_master_list()
+            self._log_import(f"Stored {record_count} records.")
 
             if upload_to_firebase:
                 self._log_import("Uploading data to Firebase Firestore... (This may take a while)")
@@ -352,7 +353,7 @@ The Excel file must contain columns with the following headers (order does not m
 
 
             self._log_import("\nImport complete! The student master list has been updated.")
-            messagebox.showinfo("Success", f"Successfully imported {len(df)} records into the master list.")
+            messagebox.showinfo("Success", f"Successfully imported {record_count} records into the master list.")
 
         except Exception as e:
             error_message = f"An error occurred: {e}"
@@ -365,7 +366,8 @@ The Excel file must contain columns with the following headers (order does not m
         """Upload all local database records to Firebase Firestore."""
         response = messagebox.askyesno(
             "Confirm Upload", 
-            "This will upload all records from the local database to Firebase Firestore. Continue?"
+            "This will upload all changes from the local database to Firebase Firestore.\n\n"
+            "Students that were removed from the local database will also be DELETED from Firestore. Continue?"
         )
         if not response:
             return
@@ -385,14 +387,16 @@ The Excel file must contain columns with the following headers (order does not m
                 return
             
             self._log_import(f"Found {len(records)} records in local database.")
-            self._log_import("Uploading to Firebase... (This may take a while)")
+            self._log_import("Uploading changes to Firebase... (This may take a while)")
             
-            count = manager.upload_local_to_firestore(
-                progress_callback=lambda c: self._log_import(f"Uploaded {c} records...")
+            report = manager.sync_to_firestore(
+                progress_callback=lambda c: self._log_import(f"Sent {c} changes...")
             )
             
-            self._log_import(f"\nSuccess! Uploaded {count} records to Firebase.")
-            messagebox.showinfo("Success", f"Uploaded {count} records to Firebase.")
+            summary = (f"{len(report.inserted)} added, {len(report.updated)} updated, "
+                       f"{len(report.deleted)} deleted, {report.unchanged} unchanged")
+            self._log_import(f"\nSuccess! Synced local database to Firebase ({summary}).")
+            messagebox.showinfo("Success", f"Synced local database to Firebase ({summary}).")
             
         except Exception as e:
             error_msg = f"Error uploading to Firebase: {e}"
@@ -663,40 +667,50 @@ The Excel file must contain columns with the following headers (order does not m
             self.log("Reading Excel file...")
             
             try:
-                df = self.qr_generator.read_excel()
-                total_students = len(df)
-                self.log(f"Found {total_students} students in the Excel file.")
+                # Only the sheet dimensions are read here; the rows are streamed below
+                total_students = count_excel_rows(self.qr_generator.excel_path)
+                if total_students is not None:
+                    self.log(f"Found up to {total_students} students in the Excel file.")
             except Exception as e:
                 self.log(f"Error reading Excel file: {str(e)}")
                 messagebox.showerror("Error", f"Failed to read Excel file: {str(e)}")
                 return
             
-            self.progress['maximum'] = total_students
+            self.progress['maximum'] = total_students or 1
             success_count = 0
-            for index, row in df.iterrows():
-                try:
-                    student_id = str(row.get('Student ID', '')).strip()
-                    if not student_id:
-                        self.log(f"Skipping row {index + 2}: Missing Student ID")
-                        continue
-                    
-                    student_name = row.get('Student Name', 'N/A').strip()
-                    self.log(f"Generating QR code for {student_name} (ID: {student_id})")
-                    
-                    self.qr_generator.generate_qr_code(row)
-                    success_count += 1
-                    
-                    self.progress['value'] = index + 1
-                    self.update_status(f"Processed {index + 1}/{total_students} students")
+            processed = 0
+            # The manifest records every generated code, so students whose section
+            # and key are unchanged are skipped and stale codes are regenerated
+            manifest = QRManifest(self.qr_generator.output_path)
+            try:
+                chunks = self.qr_generator.read_excel_chunks()
+                results = self.qr_generator.iter_batch_qr_codes(chunks, workers=1, manifest=manifest)
+                for success, message in results:
+                    self.log(message)
+                    if success:
+                        success_count += 1
                     
-                except Exception as e:
-                    self.log(f"Error processing student {student_id}: {str(e)}")
+                    processed += 1
+                    if total_students:
+                        self.progress['value'] = min(processed, total_students)
+                        self.update_status(f"Processed {processed}/{total_students} students")
+                    else:
+                        self.update_status(f"Processed {processed} students")
+            except (FileNotFoundError, ValueError) as e:
+                # The header is only checked once the first chunk is read
+                self.log(f"Error reading Excel file: {str(e)}")
+                messagebox.showerror("Error", f"Failed to read Excel file: {str(e)}")
+                return
+            finally:
+                manifest.close()
+            # The row count includes empty rows, which are never yielded
+            self.progress['value'] = self.progress['maximum']
             
             if success_count > 0:
                 self.log(f"\nSuccessfully generated {success_count} QR codes!")
                 messagebox.showinfo("Success", f"Successfully generated {success_count} QR codes!")
             else:
-                self.log("\nNo QR codes were generated. Please check the log for errors.")
+                self.log("\nNo QR codes were generated. All codes may be up to date; please check the log.")
                 
         except Exception as e:
             self.log(f"An unexpected error occurred: {str(e)}")
@@ -799,21 +813,28 @@ The Excel file must contain columns with the following headers (order does not m
     def _run_image_upload(self, folder_path):
         try:
             manager = ImageManager(images_dir=folder_path)
-            # We need to capture the output of the manager, but for now let's just run it
-            # Ideally ImageManager should accept a callback or return results
-            # For now we will assume it works and just log start/end
-            
-            # Since ImageManager methods might print to stdout, we can't easily capture it without redirecting stdout
-            # or modifying ImageManager. For this task, we'll just run it.
-            
-            # We'll use upload_images
+            # upload_images prints per-file progress to stdout and returns an
+            # UploadReport (None if it couldn't start), which is logged here
             self._log_image(f"Uploading images from {folder_path}...")
-            manager.upload_images()
-            
-            self._log_image("Image upload process completed.")
-            messagebox.showinfo("Success", "Image upload process completed.")
+            report = manager.upload_images()
+
+            if report is None:
+                self._log_image("Image upload did not run. Check the Drive credentials and the image folder.")
+                messagebox.showerror("Error", "Image upload did not run. Check the Drive credentials and the image folder.")
+                return
+
+            self._log_image(f"Uploaded {report.uploaded}, replaced {report.replaced}, "
+                            f"skipped {report.skipped}, failed {report.failed}.")
+            for error in report.errors:
+                self._log_image(f"Failed: {error}")
+
+            if report.failed:
+                messagebox.showwarning("Warning", f"Image upload finished with {report.failed} failed file(s). "
+                                                  "See the log for details.")
+            else:
+                self._log_image("Image upload process completed.")
+                messagebox.showinfo("Success", "Image upload process completed.")
 
-            
         except Exception as e:
             self._log_image(f"Error: {e}")
             messagebox.showerror("Error", f"Image upload failed: {e}")
@@ -825,15 +846,13 @@ The Excel file must contain columns with the following headers (order does not m
             self._log_import(f"Reading data from: {os.path.basename(file_path)}")
             importer = ImporterBuilder(file_path).build()
             
-            self._log_import("Parsing Excel file...")
-            df = importer.parse_excel_file()
-            self._log_import(f"Found {len(df)} records in the file.")
-
+            # The file is streamed into the local database chunk by chunk
             self._log_import("Storing data into the local database... (This may take a moment)")
-            importer.store_master_list(df)
+            record_count = importer.import_master_list()
+            self._log_import(f"Stored {record_count} records.")
 
             self._log_import("\nImport complete! The student master list has been updated.")
-            messagebox.showinfo("Success", f"Successfully imported {len(df)} records into the master list.")
+            messagebox.showinfo("Success", f"Successfully imported {record_count} records into the master list.")
 
         except Exception as e:
             error_message = f"An error occurred: {e}"
@@ -883,7 +902,9 @@ The Excel file must contain columns with the following headers (order does not m
                 raise ConnectionError("Not connected to Firestore.")
 
             report_gen = ExcelReportGenerator(db_client=self.db)
-            report_gen.generate_report(start_date, end_date, output_path, section)
+            cache = AttendanceCache()
+            cache.evict()
+            report_gen.generate_report(start_date, end_date, output_path, section, cache=cache)
 
             self._log_report_gen(f"\nSUCCESS: Report generated and saved to {output_path}")
             messagebox.showinfo("Success", "Attendance report has been generated successfully.")
@@ -1051,40 +1072,50 @@ The Excel file must contain columns with the following headers (order does not m
             self.log("Reading Excel file...")
             
             try:
-                df = self.qr_generator.read_excel()
-                total_students = len(df)
-                self.log(f"Found {total_students} students in the Excel file.")
+                # Only the sheet dimensions are read here; the rows are streamed below
+                total_students = count_excel_rows(self.qr_generator.excel_path)
+                if total_students is not None:
+                    self.log(f"Found up to {total_students} students in the Excel file.")
             except Exception as e:
                 self.log(f"Error reading Excel file: {str(e)}")
                 messagebox.showerror("Error", f"Failed to read Excel file: {str(e)}")
                 return
             
-            self.progress['maximum'] = total_students
+            self.progress['maximum'] = total_students or 1
             success_count = 0
-            for index, row in df.iterrows():
-                try:
-                    student_id = str(row.get('Student ID', '')).strip()
-                    if not student_id:
-                        self.log(f"Skipping row {index + 2}: Missing Student ID")
-                        continue
-                    
-                    student_name = row.get('Student Name', 'N/A').strip()
-                    self.log(f"Generating QR code for {student_name} (ID: {student_id})")
-                    
-                    self.qr_generator.generate_qr_code(row)
-                    success_count += 1
-                    
-                    self.progress['value'] = index + 1
-                    self.update_status(f"Processed {index + 1}/{total_students} students")
+            processed = 0
+            # The manifest records every generated code, so students whose section
+            # and key are unchanged are skipped and stale codes are regenerated
+            manifest = QRManifest(self.qr_generator.output_path)
+            try:
+                chunks = self.qr_generator.read_excel_chunks()
+                results = self.qr_generator.iter_batch_qr_codes(chunks, workers=1, manifest=manifest)
+                for success, message in results:
+                    self.log(message)
+                    if success:
+                        success_count += 1
                     
-                except Exception as e:
-                    self.log(f"Error processing student {student_id}: {str(e)}")
+                    processed += 1
+                    if total_students:
+                        self.progress['value'] = min(processed, total_students)
+                        self.update_status(f"Processed {processed}/{total_students} students")
+                    else:
+                        self.update_status(f"Processed {processed} students")
+            except (FileNotFoundError, ValueError) as e:
+                # The header is only checked once the first chunk is read
+                self.log(f"Error reading Excel file: {str(e)}")
+                messagebox.showerror("Error", f"Failed to read Excel file: {str(e)}")
+                return
+            finally:
+                manifest.close()
+            # The row count includes empty rows, which are never yielded
+            self.progress['value'] = self.progress['maximum']
             
             if success_count > 0:
                 self.log(f"\nSuccessfully generated {success_count} QR codes!")
                 messagebox.showinfo("Success", f"Successfully generated {success_count} QR codes!")
             else:
-                self.log("\nNo QR codes were generated. Please check the log for errors.")
+                self.log("\nNo QR codes were generated. All codes may be up to date; please check the log.")
                 
         except Exception as e:
             self.log(f"An unexpected error occurred: {str(e)}")
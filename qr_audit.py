@@ -0,0 +1,231 @@
+"""
+Audit of a generated QR code output tree.
+Decodes every PNG under Output/Section/StudentID/ in a process pool, decrypts
+it with the current key and cross-checks the result against the local
+master_list table, reporting unreadable codes, mismatches and missing students.
+
+Usage:
+    python qr_audit.py qr --key-file encryption_key.key --master-list master_list.db --json audit.json
+"""
+import os
+import sys
+import json
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from PIL import Image
+from qr_crypto import QRCodeCrypto, QRKeyring
+from qr_scan import zbar_decode, decode_qr_image, decrypt_scanned
+
+# Audit statuses of a single QR code
+STATUS_OK = 'ok'
+STATUS_UNREADABLE = 'unreadable'
+STATUS_DECRYPT_FAILED = 'decrypt_failed'
+
+
+@dataclass
+class AuditReport:
+    """Outcome of an audit run. Each issue is a dict describing one QR code or student."""
+    checked: int = 0
+    ok: int = 0
+    unreadable: List[Dict[str, str]] = field(default_factory=list)
+    decrypt_failed: List[Dict[str, str]] = field(default_factory=list)
+    mismatches: List[Dict[str, str]] = field(default_factory=list)
+    wrong_section: List[Dict[str, str]] = field(default_factory=list)
+    unknown_students: List[Dict[str, str]] = field(default_factory=list)
+    missing_students: List[Dict[str, str]] = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        return self.ok == self.checked and not self.missing_students
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            'checked': self.checked,
+            'ok': self.ok,
+            'unreadable': len(self.unreadable),
+            'decrypt_failed': len(self.decrypt_failed),
+            'mismatches': len(self.mismatches),
+            'wrong_section': len(self.wrong_section),
+            'unknown_students': len(self.unknown_students),
+            'missing_students': len(self.missing_students),
+        }
+
+    def to_dict(self) -> Dict:
+        report = asdict(self)
+        report['summary'] = self.summary()
+        return report
+
+
+def iter_qr_files(output_dir: str) -> Iterator[Tuple[str, str, str]]:
+    """Yield (section, student_id, png_path) for every QR code in the output tree."""
+    with os.scandir(output_dir) as sections:
+        for section in sections:
+            if not section.is_dir():
+                continue
+            with os.scandir(section.path) as students:
+                for student in students:
+                    png_path = os.path.join(student.path, f"{student.name}.png")
+                    if student.is_dir() and os.path.isfile(png_path):
+                        yield section.name, student.name, png_path
+
+
+def _decode_image(png_path: str) -> Optional[bytes]:
+    """Decode the QR code in an image, returning its data as zbar reports it, or None."""
+    with Image.open(png_path) as img:
+        return decode_qr_image(img)
+
+
+# Per-process crypto used by the audit workers, built once from the key
+_worker_crypto: Union[QRCodeCrypto, QRKeyring, None] = None
+
+
+def _init_audit_worker(key: Union[bytes, Dict[str, Any]]) -> None:
+    """Initialize the decryption context for an audit worker process."""
+    global _worker_crypto
+    # Keyrings are sent to the workers in their serialized form
+    _worker_crypto = QRKeyring.from_dict(key) if isinstance(key, dict) else QRCodeCrypto(key)
+
+
+def _audit_file(png_path: str) -> Tuple[str, Optional[str]]:
+    """Decode and decrypt one QR code.
+
+    Returns:
+        Tuple of (status, decrypted LRN or error message)
+    """
+    try:
+        payload = _decode_image(png_path)
+    except Exception as e:
+        return STATUS_UNREADABLE, str(e)
+    if payload is None:
+        return STATUS_UNREADABLE, None
+
+    try:
+        return STATUS_OK, decrypt_scanned(_worker_crypto, payload)
+    except ValueError as e:
+        return STATUS_DECRYPT_FAILED, str(e)
+
+
+def load_master_list(db_path: str) -> Dict[str, str]:
+    """Load the LRN -> section mapping from the local master_list table."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return {str(lrn): section for lrn, section in conn.execute('SELECT lrn, section FROM master_list')}
+    finally:
+        conn.close()
+
+
+def audit_output_tree(output_dir: str, key: Union[bytes, QRKeyring], master_list_db: Optional[str] = 'master_list.db',
+                      workers: Optional[int] = None) -> AuditReport:
+    """
+    Audit every QR code in an output tree.
+
+    Args:
+        output_dir: Root output directory of the QR codes
+        key: The current 32-byte encryption key, or a keyring to accept codes
+            made with any of its keys
+        master_list_db: Path to the local master list database, or None to skip the cross-check
+        workers: Number of worker processes. None uses all CPU cores, 1 runs serially.
+
+    Returns:
+        AuditReport with the problems found
+
+    Raises:
+        ImportError: If pyzbar or the zbar library is not available
+    """
+    if zbar_decode is None:
+        raise ImportError("pyzbar and the zbar library are required to decode QR codes.")
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if isinstance(key, QRKeyring):
+        key = key.to_dict()
+
+    files = sorted(iter_qr_files(output_dir))
+    paths = [png_path for _, _, png_path in files]
+
+    if workers <= 1:
+        _init_audit_worker(key)
+        results = map(_audit_file, paths)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_audit_worker, initargs=(key,))
+        # Several chunks per worker keeps the pool balanced without paying IPC per image
+        results = executor.map(_audit_file, paths, chunksize=max(1, len(paths) // (workers * 4)))
+
+    master_list = load_master_list(master_list_db) if master_list_db else None
+    report = AuditReport()
+    seen = set()
+
+    try:
+        for (section, student_id, png_path), (status, value) in zip(files, results):
+            report.checked += 1
+            seen.add(student_id)
+            entry = {'section': section, 'student_id': student_id, 'path': png_path}
+
+            if status == STATUS_UNREADABLE:
+                report.unreadable.append({**entry, 'error': value or 'No QR code found'})
+                continue
+            if status == STATUS_DECRYPT_FAILED:
+                report.decrypt_failed.append({**entry, 'error': value})
+                continue
+            if value != student_id:
+                report.mismatches.append({**entry, 'decoded_lrn': value})
+                continue
+
+            if master_list is not None:
+                if student_id not in master_list:
+                    report.unknown_students.append(entry)
+                    continue
+                if master_list[student_id] != section:
+                    report.wrong_section.append({**entry, 'expected_section': master_list[student_id]})
+                    continue
+            report.ok += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if master_list is not None:
+        report.missing_students = [
+            {'student_id': lrn, 'section': section}
+            for lrn, section in master_list.items() if lrn not in seen
+        ]
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check that every generated QR code decodes to the right student.")
+    parser.add_argument('output_dir', help="Root output directory of the QR codes")
+    parser.add_argument('--key-file', default='encryption_key.key', help="Base64 key file of the current key")
+    parser.add_argument('--keyring', help="Keyring JSON file; used instead of --key-file")
+    parser.add_argument('--master-list', default='master_list.db', help="Local master list database")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all CPU cores)")
+    parser.add_argument('--json', help="Write the full report to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.keyring:
+        key = QRKeyring.load(args.keyring)
+    elif os.path.isfile(args.key_file):
+        key = QRCodeCrypto.load_key(args.key_file)
+    else:
+        print(f"Key file not found: {args.key_file}")
+        return 2
+    master_list_db = args.master_list if os.path.isfile(args.master_list) else None
+    if master_list_db is None:
+        print(f"Master list database not found: {args.master_list}. Skipping the cross-check.")
+
+    report = audit_output_tree(args.output_dir, key, master_list_db, args.workers)
+    for name, count in report.summary().items():
+        print(f"{name}: {count}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report.to_dict(), f, indent=2)
+        print(f"Full report written to {args.json}")
+    return 0 if report.passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
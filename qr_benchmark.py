@@ -0,0 +1,168 @@
+"""
+Throughput benchmark for the QR code pipeline.
+Generates synthetic students and times each stage separately (encrypt, QR
+build, render, PNG write, decode, decrypt), reporting latency percentiles and
+images per second as JSON so renderer and payload changes can be compared.
+
+Usage:
+    python qr_benchmark.py --students 1000 --compact --output benchmark.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import numpy as np
+from PIL import Image
+import qrcode
+from qr_crypto import QRCodeCrypto
+from qr_generator import QRBatchEncoder, render_qr_image
+from qr_scan import zbar_decode, decode_qr_image, decrypt_scanned
+
+STAGES = ['encrypt', 'build', 'render', 'png_write', 'decode', 'decrypt']
+# Stages that make up generating one QR code, used for images per second
+GENERATION_STAGES = ['encrypt', 'build', 'render', 'png_write']
+PERCENTILES = [50, 90, 99]
+
+
+def synthetic_lrns(count: int, seed: int = 0) -> List[str]:
+    """Generate unique, reproducible 12-digit LRNs."""
+    rng = random.Random(seed)
+    return [str(lrn) for lrn in rng.sample(range(10 ** 11, 10 ** 12), count)]
+
+
+def summarize(latencies_ns: List[int]) -> Dict[str, float]:
+    """Summarize per-item latencies in milliseconds."""
+    values = np.asarray(latencies_ns, dtype=np.float64) / 1e6
+    summary = {f"p{p}_ms": round(float(np.percentile(values, p)), 4) for p in PERCENTILES}
+    summary['mean_ms'] = round(float(values.mean()), 4)
+    summary['max_ms'] = round(float(values.max()), 4)
+    summary['total_s'] = round(float(values.sum()) / 1000, 4)
+    return summary
+
+
+def run_benchmark(students: int = 500, compact_payload: bool = False, mask_pattern: Optional[int] = None,
+                  seed: int = 0, output_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run every pipeline stage for a batch of synthetic students.
+
+    Args:
+        students: Number of synthetic students
+        compact_payload: Use the compact payload format instead of the legacy one
+        mask_pattern: Optional QR mask pattern to pin, as QRCodeGenerator does
+        seed: Seed for the synthetic LRNs
+        output_dir: Directory for the PNG files; a temporary one is used if None
+
+    Returns:
+        JSON-serializable benchmark results
+    """
+    if students < 1:
+        raise ValueError("At least one student is required.")
+
+    crypto = QRCodeCrypto(os.urandom(32))
+    encoder = QRBatchEncoder(
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=6,
+        border=2,
+        mask_pattern=mask_pattern,
+    )
+    encrypt = crypto.encrypt_lrn if compact_payload else crypto.encrypt_data
+    latencies: Dict[str, List[int]] = {stage: [] for stage in STAGES}
+    failures = 0
+    png_bytes_total = 0
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        target_dir = output_dir or temp_dir
+        os.makedirs(target_dir, exist_ok=True)
+
+        for lrn in synthetic_lrns(students, seed):
+            t0 = time.perf_counter_ns()
+            payload = encrypt(lrn)
+            t1 = time.perf_counter_ns()
+            qr = encoder.encode(payload)
+            matrix = qr.get_matrix()
+            t2 = time.perf_counter_ns()
+            img = render_qr_image(matrix, qr.box_size, fill_color="blue", back_color="white")
+            t3 = time.perf_counter_ns()
+            buffer = io.BytesIO()
+            img.save(buffer, 'PNG')
+            path = os.path.join(target_dir, f"{lrn}.png")
+            with open(path, 'wb') as f:
+                f.write(buffer.getvalue())
+            t4 = time.perf_counter_ns()
+
+            latencies['encrypt'].append(t1 - t0)
+            latencies['build'].append(t2 - t1)
+            latencies['render'].append(t3 - t2)
+            latencies['png_write'].append(t4 - t3)
+            png_bytes_total += buffer.tell()
+
+            if zbar_decode is not None:
+                t0 = time.perf_counter_ns()
+                with Image.open(path) as scanned:
+                    scanned_payload = decode_qr_image(scanned)
+                t1 = time.perf_counter_ns()
+                latencies['decode'].append(t1 - t0)
+            else:
+                scanned_payload = payload
+
+            t0 = time.perf_counter_ns()
+            try:
+                # zbar returns the payload transcoded to text; decrypt_scanned undoes that
+                if scanned_payload is None or decrypt_scanned(crypto, scanned_payload) != lrn:
+                    failures += 1
+            except ValueError:
+                failures += 1
+            latencies['decrypt'].append(time.perf_counter_ns() - t0)
+
+    generation_s = sum(sum(latencies[stage]) for stage in GENERATION_STAGES) / 1e9
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'students': students,
+        'payload_format': 'compact' if compact_payload else 'legacy',
+        'payload_bytes': len(payload),
+        'qr_version': qr.version,
+        'mask_pattern': mask_pattern,
+        'images_per_second': round(students / generation_s, 2) if generation_s else None,
+        'avg_png_bytes': round(png_bytes_total / students, 1),
+        'decode_verified': zbar_decode is not None,
+        'failures': failures,
+        'stages': {stage: summarize(values) if values else None for stage, values in latencies.items()},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the QR code generation and verification pipeline.")
+    parser.add_argument('--students', type=int, default=500, help="Number of synthetic students")
+    parser.add_argument('--compact', action='store_true', help="Use the compact payload format")
+    parser.add_argument('--mask-pattern', type=int, choices=range(8), default=None, help="Pin the QR mask pattern")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic LRNs")
+    parser.add_argument('--output', help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    if zbar_decode is None:
+        print("pyzbar/zbar not available; the decode stage is skipped.", file=sys.stderr)
+
+    results = run_benchmark(args.students, args.compact, args.mask_pattern, args.seed)
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+    return 1 if results['failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,19 +7,27 @@ import json
 from base64 import b64encode, b64decode
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
-from typing import Dict, Any, Tuple, Optional
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from typing import Dict, Any, Tuple, Optional, Iterable, List
+import qr_payload
+
+NONCE_SIZE = 12  # 96 bits for GCM
+TAG_SIZE = 16
 
 class QRCodeCrypto:
     """Handles encryption and decryption of QR code data using a shared secret key."""
     
-    def __init__(self, key: Optional[bytes] = None, key_file: str = 'encryption_key.key'):
+    def __init__(self, key: Optional[bytes] = None, key_file: str = 'encryption_key.key',
+                 key_id: Optional[int] = None):
         """Initialize with an optional 32-byte key or load from file.
         
         Args:
             key: 32-byte key for AES-256. If None, will try to load from key_file.
             key_file: Path to the key file to load/save the key.
+            key_id: Optional keyring ID (0-15) written into compact payload headers.
         """
         self.key_file = key_file
+        self.key_id = key_id
         
         if key is not None:
             if len(key) != 32:
@@ -33,6 +41,9 @@ class QRCodeCrypto:
             with open(key_file, 'wb') as f:
                 f.write(b64encode(self.key))
             
+        # Keeps the expanded AES key between calls
+        self._aesgcm = AESGCM(self.key)
+
     def key_exists(self) -> bool:
         """Check if a key file exists."""
         return os.path.exists(self.key_file)
@@ -67,17 +78,85 @@ class QRCodeCrypto:
         data = str(data).encode('utf-8')
         
         # Generate a random nonce
-        nonce = get_random_bytes(12)  # 96 bits for GCM
+        nonce = get_random_bytes(NONCE_SIZE)
+        
+        # Return as raw bytes for byte-mode QR code encoding
+        return self._seal(nonce, data)
+    
+    def encrypt_many(self, payloads: Iterable[Dict[str, Any]]) -> List[bytes]:
+        """Encrypt many data dictionaries with the same key.
+        
+        The nonces for the whole batch are cut from one random buffer. Random
+        96-bit nonces stay safe for GCM up to about 2**32 messages per key.
+        
+        Args:
+            payloads: Data dictionaries to encrypt
+            
+        Returns:
+            Encrypted blobs in the same format as encrypt_data, in input order
+        """
+        payloads = [str(data).encode('utf-8') for data in payloads]
+        nonces = get_random_bytes(NONCE_SIZE * len(payloads))
+        return [
+            self._seal(nonces[i * NONCE_SIZE:(i + 1) * NONCE_SIZE], data)
+            for i, data in enumerate(payloads)
+        ]
+    
+    def _seal(self, nonce: bytes, data: bytes) -> bytes:
+        """Encrypt bytes into the nonce + tag + ciphertext wire format."""
+        # AESGCM appends the tag to the ciphertext
+        sealed = self._aesgcm.encrypt(nonce, data, None)
+        return nonce + sealed[-TAG_SIZE:] + sealed[:-TAG_SIZE]
+    
+    def encrypt_lrn(self, lrn: str) -> bytes:
+        """Encrypt a student LRN into the compact payload format.
+        
+        See qr_payload for the layout. The payload is 26 bytes instead of the
+        40 bytes encrypt_data produces for an LRN. If this key has a key ID,
+        it is written into the header.
+        
+        Args:
+            lrn: 12-digit student LRN
+            
+        Returns:
+            Compact payload bytes
+            
+        Raises:
+            ValueError: If the LRN is not exactly 12 digits
+        """
+        header = qr_payload.encode_header(self.key_id)
+        nonce = get_random_bytes(qr_payload.NONCE_SIZE)
+        packed = qr_payload.pack_lrn(lrn)
+        
+        # A truncated GCM tag is the leading bytes of the full tag
+        sealed = self._aesgcm.encrypt(nonce, packed, header)
+        ciphertext, tag = sealed[:-TAG_SIZE], sealed[-TAG_SIZE:][:qr_payload.TAG_SIZE]
         
-        # Create cipher and encrypt
-        cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
-        ciphertext, tag = cipher.encrypt_and_digest(data)
+        return header + nonce + tag + ciphertext
+    
+    def decrypt_payload(self, payload: bytes) -> str:
+        """Decrypt a QR payload in either the compact or the legacy format.
         
-        # Combine nonce, tag, and ciphertext
-        encrypted_data = nonce + tag + ciphertext
+        Args:
+            payload: Raw bytes read from the QR code
+            
+        Returns:
+            The student LRN (or the legacy payload string)
+            
+        Raises:
+            ValueError: If decryption or verification fails
+        """
+        if not qr_payload.is_compact_payload(payload):
+            return self.decrypt_data(payload)
         
-        # Return as base64 string for easy QR code encoding
-        return encrypted_data
+        try:
+            header, nonce, tag, ciphertext = qr_payload.split_payload(payload)
+            # AESGCM only verifies full-length tags, so truncated ones go through pycryptodome
+            cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce, mac_len=qr_payload.TAG_SIZE)
+            cipher.update(header)
+            return qr_payload.unpack_lrn(cipher.decrypt_and_verify(ciphertext, tag))
+        except Exception as e:
+            raise ValueError("Decryption failed. The QR code may be corrupted or the key is incorrect.") from e
     
     def decrypt_data(self, encrypted_data: bytes) -> str:
         """Decrypt the data from an encrypted string.
@@ -92,21 +171,41 @@ class QRCodeCrypto:
             ValueError: If decryption or verification fails
         """
         try:
-            # Extract nonce (first 12 bytes), tag (next 16 bytes), and ciphertext (the rest)
-            nonce = encrypted_data[:12]
-            tag = encrypted_data[12:28]
-            ciphertext = encrypted_data[28:]
-            
-            # Create cipher and decrypt
-            cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
-            data = cipher.decrypt_and_verify(ciphertext, tag)
-            
-            # Convert back to dictionary
-            return data.decode('utf-8')
-            
+            return self._open(encrypted_data).decode('utf-8')
         except Exception as e:
             raise ValueError("Decryption failed. The QR code may be corrupted or the key is incorrect.") from e
     
+    def decrypt_many(self, encrypted_blobs: Iterable[bytes]) -> List[str]:
+        """Decrypt many encrypted blobs with the same key.
+        
+        Args:
+            encrypted_blobs: Blobs in the format returned by encrypt_data
+            
+        Returns:
+            Decrypted data strings, in input order
+            
+        Raises:
+            ValueError: If decryption or verification of any blob fails
+        """
+        results = []
+        for index, encrypted_data in enumerate(encrypted_blobs):
+            try:
+                results.append(self._open(encrypted_data).decode('utf-8'))
+            except Exception as e:
+                raise ValueError(f"Decryption failed for item {index}. The QR code may be corrupted or the key is incorrect.") from e
+        return results
+    
+    def _open(self, encrypted_data: bytes) -> bytes:
+        """Decrypt and verify a nonce + tag + ciphertext blob."""
+        # Extract nonce (first 12 bytes), tag (next 16 bytes), and ciphertext (the rest)
+        nonce = encrypted_data[:NONCE_SIZE]
+        tag = encrypted_data[NONCE_SIZE:NONCE_SIZE + TAG_SIZE]
+        ciphertext = encrypted_data[NONCE_SIZE + TAG_SIZE:]
+        if len(nonce) != NONCE_SIZE or len(tag) != TAG_SIZE:
+            raise ValueError("Encrypted data is too short.")
+        
+        return self._aesgcm.decrypt(nonce, ciphertext + tag, None)
+    
     def save_key(self, file_path: str) -> None:
         """Save the key to a file.
         
@@ -143,3 +242,144 @@ class QRCodeCrypto:
         crypto = cls()
         crypto.save_key(file_path)
         return crypto
+
+
+class QRKeyring:
+    """Holds several encryption keys by key ID so keys can be rotated gradually.
+    
+    New codes are encrypted with the active key and carry its ID in the
+    payload header, so decryption picks the right key with one lookup. Codes
+    made with older keys stay readable for as long as their key is kept.
+    """
+    
+    def __init__(self, keys: Optional[Dict[int, bytes]] = None, active_key_id: Optional[int] = None):
+        """Initialize the keyring.
+        
+        Args:
+            keys: Optional mapping of key ID (0-15) to 32-byte key
+            active_key_id: ID of the key used for new codes. Defaults to the highest ID.
+        """
+        self._keys: Dict[int, QRCodeCrypto] = {}
+        self.active_key_id: Optional[int] = None
+        for key_id, key in (keys or {}).items():
+            self.add_key(key, key_id, activate=False)
+        if self._keys:
+            self.activate(max(self._keys) if active_key_id is None else active_key_id)
+    
+    @property
+    def key_ids(self) -> List[int]:
+        return sorted(self._keys)
+    
+    @property
+    def active(self) -> QRCodeCrypto:
+        """The crypto instance of the active key."""
+        if self.active_key_id is None:
+            raise ValueError("The keyring has no active key.")
+        return self._keys[self.active_key_id]
+    
+    def get(self, key_id: int) -> Optional[QRCodeCrypto]:
+        return self._keys.get(key_id)
+    
+    def add_key(self, key: bytes, key_id: Optional[int] = None, activate: bool = True) -> int:
+        """Add a key to the keyring.
+        
+        Args:
+            key: 32-byte key for AES-256
+            key_id: ID to store the key under. If None, the next free ID after
+                the active one is used, wrapping around after 15.
+            activate: Make the key the active key for new codes
+            
+        Returns:
+            The ID of the added key
+            
+        Raises:
+            ValueError: If the key or ID is invalid, the ID is taken or the keyring is full
+        """
+        id_count = qr_payload.MAX_KEY_ID + 1
+        if key_id is None:
+            if len(self._keys) >= id_count:
+                raise ValueError("The keyring is full. Remove a retired key first.")
+            key_id = 0 if self.active_key_id is None else (self.active_key_id + 1) % id_count
+            while key_id in self._keys:
+                key_id = (key_id + 1) % id_count
+        if not 0 <= key_id <= qr_payload.MAX_KEY_ID:
+            raise ValueError(f"Key ID must be between 0 and {qr_payload.MAX_KEY_ID}.")
+        if key_id in self._keys:
+            raise ValueError(f"Key ID {key_id} is already in use.")
+        
+        self._keys[key_id] = QRCodeCrypto(key, key_id=key_id)
+        if activate:
+            self.activate(key_id)
+        return key_id
+    
+    def activate(self, key_id: int) -> None:
+        """Make a key the active key for new codes."""
+        if key_id not in self._keys:
+            raise ValueError(f"Unknown key ID: {key_id}")
+        self.active_key_id = key_id
+    
+    def remove_key(self, key_id: int) -> None:
+        """Remove a retired key. Codes made with it can no longer be decrypted."""
+        if key_id == self.active_key_id:
+            raise ValueError("The active key cannot be removed.")
+        self._keys.pop(key_id, None)
+    
+    def encrypt_lrn(self, lrn: str) -> bytes:
+        """Encrypt an LRN into a compact payload with the active key."""
+        return self.active.encrypt_lrn(lrn)
+    
+    def decrypt_payload(self, payload: bytes) -> str:
+        """Decrypt a QR payload with the key it was made with.
+        
+        Compact payloads with a key ID are decrypted with that key directly.
+        Payloads without one (legacy and version 1) try each key, active first.
+        
+        Args:
+            payload: Raw bytes read from the QR code
+            
+        Returns:
+            The student LRN (or the legacy payload string)
+            
+        Raises:
+            ValueError: If no key in the keyring decrypts the payload
+        """
+        key_id = None
+        if qr_payload.is_compact_payload(payload):
+            _, key_id = qr_payload.decode_header(payload)
+        
+        if key_id is not None:
+            crypto = self._keys.get(key_id)
+            if crypto is None:
+                raise ValueError(f"Decryption failed. Key ID {key_id} is not in the keyring.")
+            return crypto.decrypt_payload(payload)
+        
+        for candidate in sorted(self._keys, key=lambda k: k != self.active_key_id):
+            try:
+                return self._keys[candidate].decrypt_payload(payload)
+            except ValueError:
+                continue
+        raise ValueError("Decryption failed. The QR code may be corrupted or its key is not in the keyring.")
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the keyring with base64 keys, e.g. for Firestore or a JSON file."""
+        return {
+            'active_key_id': self.active_key_id,
+            'keys': {str(key_id): crypto.get_key_base64() for key_id, crypto in self._keys.items()},
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'QRKeyring':
+        """Load a keyring serialized with to_dict."""
+        keys = {int(key_id): b64decode(key_b64) for key_id, key_b64 in data.get('keys', {}).items()}
+        return cls(keys, data.get('active_key_id'))
+    
+    def save(self, file_path: str) -> None:
+        """Save the keyring to a JSON file."""
+        with open(file_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+    
+    @classmethod
+    def load(cls, file_path: str) -> 'QRKeyring':
+        """Load a keyring from a JSON file written by save."""
+        with open(file_path, 'r') as f:
+            return cls.from_dict(json.load(f))
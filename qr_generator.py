@@ -3,21 +3,161 @@ import os
 import json
 import base64
 import io
-from PIL import Image
-from typing import Optional, Dict, Any, Union, Tuple, List
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from PIL import Image, ImageColor
+from typing import Optional, Dict, Any, Union, Tuple, List, Iterator, Iterable
 import pandas as pd
-from qr_crypto import QRCodeCrypto
+from excel_reader import DEFAULT_CHUNK_SIZE, iter_excel_chunks
+from qr_crypto import QRCodeCrypto, QRKeyring
+import qr_payload
+from qr_manifest import QRManifest
+
+
+def render_qr_image(matrix: List[List[bool]], box_size: int,
+                    fill_color: str = "black", back_color: str = "white") -> Image.Image:
+    """Rasterize a QR module matrix into a two-color palette image.
+    
+    The matrix is upscaled with NumPy in one step instead of drawing every
+    module as a separate rectangle, and the two-entry palette lets Pillow
+    write the PNG at 1 bit per pixel.
+    
+    Args:
+        matrix: Module matrix from QRCode.get_matrix(), border included
+        box_size: Size of each module in pixels
+        fill_color: Color of the dark modules (any Pillow color name or hex code)
+        back_color: Color of the light modules and the border
+        
+    Returns:
+        Palette-mode ('P') image of the QR code
+    """
+    modules = np.asarray(matrix, dtype=np.uint8)
+    pixels = np.repeat(np.repeat(modules, box_size, axis=0), box_size, axis=1)
+    
+    img = Image.frombytes('P', (pixels.shape[1], pixels.shape[0]), pixels.tobytes())
+    # Palette index 0 is the background, 1 the dark modules
+    img.putpalette(ImageColor.getrgb(back_color) + ImageColor.getrgb(fill_color))
+    return img
+
+
+class QRBatchEncoder:
+    """Encodes many QR codes of the same shape, reusing one QRCode object.
+    
+    The encrypted student payloads all have the same length, so the QR version
+    is resolved with a fit search once per payload length and cached. Pinning
+    the mask pattern also skips scoring all 8 masks for every code; any mask
+    is valid per the QR spec, so scanners decode the result the same way.
+    """
+    
+    def __init__(self, error_correction: int = qrcode.constants.ERROR_CORRECT_M,
+                 box_size: int = 6, border: int = 2, mask_pattern: Optional[int] = None):
+        """Initialize the batch encoder.
+        
+        Args:
+            error_correction: qrcode error correction level constant
+            box_size: Size of each module in pixels
+            border: Width of the quiet zone in modules
+            mask_pattern: Optional mask pattern (0-7) to use for every code.
+                If None, the best mask is chosen for each code as qrcode normally does.
+        """
+        self.qr = qrcode.QRCode(
+            version=None,
+            error_correction=error_correction,
+            box_size=box_size,
+            border=border,
+            mask_pattern=mask_pattern,
+        )
+        self._versions: Dict[int, int] = {}  # payload length -> QR version
+    
+    def encode(self, data: Union[bytes, str]) -> qrcode.QRCode:
+        """Encode the data and return the compiled QRCode.
+        
+        The returned object is reused by the next call, so read its matrix
+        before encoding another payload.
+        
+        Args:
+            data: Payload to encode in byte mode
+            
+        Returns:
+            The compiled QRCode
+        """
+        qr = self.qr
+        qr.clear()
+        # Keep the whole payload in byte mode so the length alone decides the version
+        qr.add_data(data, optimize=0)
+        
+        version = self._versions.get(len(data))
+        if version is not None:
+            qr.version = version
+            try:
+                qr.make(fit=False)
+                return qr
+            except qrcode.exceptions.DataOverflowError:
+                pass
+        
+        qr.version = None
+        qr.make(fit=True)
+        self._versions[len(data)] = qr.version
+        return qr
+
+
+# Per-process generator used by the parallel batch mode. Each worker builds its
+# own instance once so the key and output settings are not re-sent per student.
+_worker_generator: Optional['QRCodeGenerator'] = None
+
+
+def _init_batch_worker(encryption_key: Optional[bytes], output_path: str, mask_pattern: Optional[int],
+                       compact_payload: bool = False, keyring: Optional[Dict[str, Any]] = None) -> None:
+    """Initialize the QR code generator for a batch worker process."""
+    global _worker_generator
+    _worker_generator = QRCodeGenerator(
+        encryption_key,
+        mask_pattern=mask_pattern,
+        compact_payload=compact_payload,
+        keyring=QRKeyring.from_dict(keyring) if keyring else None,
+    )
+    _worker_generator.output_path = output_path
+
+
+def _generate_in_worker(student_data: Dict[str, Any], overwrite: bool = False) -> Tuple[bool, str, Optional[str]]:
+    """Generate a single QR code inside a batch worker process."""
+    return _worker_generator._generate_qr_code(student_data, overwrite)
+
 
 class QRCodeGenerator:
-    def __init__(self, encryption_key: Optional[bytes] = None):
+    def __init__(self, encryption_key: Optional[bytes] = None, mask_pattern: Optional[int] = None,
+                 compact_payload: bool = False, keyring: Optional[QRKeyring] = None):
         """Initialize the QR code generator.
         
         Args:
             encryption_key: Optional 32-byte key for encryption. If None, no encryption is used.
+            mask_pattern: Optional QR mask pattern (0-7) to pin for every code, skipping mask scoring.
+            compact_payload: Encode the 26-byte compact payload (see qr_payload) instead of the
+                legacy 40-byte one. Scanners must support the compact format.
+            keyring: Optional keyring. Its active key replaces encryption_key, compact
+                payloads carry the key ID, and codes made with the keyring's older
+                keys are treated as valid during incremental runs (see rotation_batch).
         """
         self.excel_path: Optional[str] = None
         self.output_path: str = os.path.join(os.getcwd(), 'qr')
-        self.crypto = QRCodeCrypto(encryption_key) if encryption_key else None
+        self.keyring = keyring
+        if keyring is not None:
+            self.encryption_key = keyring.active.key
+            self.crypto = keyring.active
+        else:
+            self.encryption_key = encryption_key
+            self.crypto = QRCodeCrypto(encryption_key) if encryption_key else None
+        self._rotation_budget: Optional[int] = None
+        self.mask_pattern = mask_pattern
+        self.compact_payload = compact_payload
+        self.qr_encoder = QRBatchEncoder(
+            error_correction=qrcode.constants.ERROR_CORRECT_M,
+            box_size=6,
+            border=2,
+            mask_pattern=mask_pattern,
+        )
     
 
     def set_excel_path(self, path: str) -> None:
@@ -75,6 +215,32 @@ class QRCodeGenerator:
         except Exception as e:
             raise Exception(f"Error reading Excel file: {str(e)}")
     
+    def read_excel_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        """Stream and validate the Excel file with student data in chunks.
+        
+        Args:
+            chunk_size: Maximum number of students per chunk
+            
+        Yields:
+            DataFrames containing student data, cleaned like read_excel
+            
+        Raises:
+            FileNotFoundError: If Excel file is not found
+            ValueError: If required columns are missing
+        """
+        required_columns = ['Student ID', 'Section']
+        
+        for chunk in iter_excel_chunks(self.excel_path, required_columns, chunk_size):
+            # Remove any rows with missing required data
+            chunk = chunk.dropna(subset=required_columns, how='any')
+            
+            # Convert Student ID to string and clean data
+            chunk['Student ID'] = chunk['Student ID'].astype(str).str.strip()
+            chunk['Section'] = chunk['Section'].astype(str).str.strip()
+            
+            if not chunk.empty:
+                yield chunk
+    
     
     def create_qr_code(self, data: Dict[str, Any], output_path: str) -> bool:
         """Generate a QR code with the given data and save it to the specified path.
@@ -86,35 +252,43 @@ class QRCodeGenerator:
         Returns:
             True if successful, False otherwise
         """
+        return self._write_qr_code(data, output_path) is not None
+    
+    def _write_qr_code(self, data: Dict[str, Any], output_path: str) -> Optional[str]:
+        """Generate a QR code, save it, and return the SHA-256 hex digest of the PNG.
+        
+        Returns:
+            Digest of the written PNG file, or None if generation failed
+        """
         try:
             # Create output directory if it doesn't exist
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
             
-            qr_data = self.crypto.encrypt_data(data)
+            if self.compact_payload:
+                qr_data = self.crypto.encrypt_lrn(data)
+            else:
+                qr_data = self.crypto.encrypt_data(data)
             
-            # Generate QR code with automatic version selection
-            qr = qrcode.QRCode(
-                version=None,
-                error_correction=qrcode.constants.ERROR_CORRECT_M,
-                box_size=6,
-                border=2,
-            )
-            qr.add_data(qr_data)
-            qr.make(fit=True)
+            # Generate QR code, reusing the version resolved for earlier payloads
+            qr = self.qr_encoder.encode(qr_data)
             
-            # Create QR code image
-            qr_img = qr.make_image(fill_color="blue", back_color="white").convert('RGB')
+            # Create QR code image straight from the module matrix
+            qr_img = render_qr_image(qr.get_matrix(), qr.box_size, fill_color="blue", back_color="white")
             
             # Save the QR code
-            qr_img.save(output_path, 'PNG')
-            return True
+            buffer = io.BytesIO()
+            qr_img.save(buffer, 'PNG')
+            png_bytes = buffer.getvalue()
+            with open(output_path, 'wb') as f:
+                f.write(png_bytes)
+            return hashlib.sha256(png_bytes).hexdigest()
             
         except Exception as e:
             print(f"Error generating QR code: {str(e)}")
-            return False
+            return None
     
-    def generate_qr_code(self, student_data: Dict[str, Any]) -> Tuple[bool, str]:
+    def generate_qr_code(self, student_data: Dict[str, Any], overwrite: bool = False) -> Tuple[bool, str]:
         """Generate a QR code for a single student.
         
         Args:
@@ -123,10 +297,20 @@ class QRCodeGenerator:
                 - Student Name (str)
                 - Year (str)
                 - Section (str)
+            overwrite: Replace an existing QR code instead of skipping the student
             
         Returns:
             Tuple of (success: bool, message: str)
         """
+        success, message, _ = self._generate_qr_code(student_data, overwrite)
+        return success, message
+    
+    def _generate_qr_code(self, student_data: Dict[str, Any], overwrite: bool = False) -> Tuple[bool, str, Optional[str]]:
+        """Generate a QR code for a single student.
+        
+        Returns:
+            Tuple of (success: bool, message: str, output_hash: Optional[str])
+        """
         try:
             # Extract student information
             student_id = str(student_data.get('Student ID', '')).strip()
@@ -134,7 +318,7 @@ class QRCodeGenerator:
 
             # Validate required fields
             if not student_id:
-                return False, f"Missing required fields for student ID: {student_id}"
+                return False, f"Missing required fields for student ID: {student_id}", None
             
             
             # Prepare minimal data for QR code - just the student ID
@@ -149,50 +333,195 @@ class QRCodeGenerator:
             output_path = os.path.join(student_dir, f"{student_id}.png")
             
             # Check if QR code already exists
-            if os.path.exists(output_path):
-                return False, f"QR code already exists for {student_id}"
+            if not overwrite and os.path.exists(output_path):
+                return False, f"QR code already exists for {student_id}", None
             
             # Generate and save QR code
-            if self.create_qr_code(qr_data, output_path):
-                return True, f"Generated QR code for {student_id}"
+            output_hash = self._write_qr_code(qr_data, output_path)
+            if output_hash is not None:
+                return True, f"Generated QR code for {student_id}", output_hash
             else:
-                return False, f"Failed to generate QR code for {student_id}"
+                return False, f"Failed to generate QR code for {student_id}", None
                 
         except Exception as e:
-            return False, f"Error processing student {student_id}: {str(e)}"
+            return False, f"Error processing student {student_id}: {str(e)}", None
+    
+    def _iter_generate(self, records: List[Dict[str, Any]], executor: Optional[ProcessPoolExecutor],
+                       workers: int, overwrite: bool) -> Iterator[Tuple[bool, str, Optional[str]]]:
+        """Generate QR codes for the records in order, serially or in the process pool."""
+        if executor is None:
+            for record in records:
+                yield self._generate_qr_code(record, overwrite)
+            return
+        
+        # Several chunks per worker keeps the pool balanced without paying IPC per student
+        chunksize = max(1, len(records) // (workers * 4))
+        yield from executor.map(partial(_generate_in_worker, overwrite=overwrite), records, chunksize=chunksize)
+    
+    def _iter_chunk(self, records: List[Dict[str, Any]], executor: Optional[ProcessPoolExecutor], workers: int,
+                    manifest: Optional[QRManifest]) -> Iterator[Tuple[bool, str]]:
+        """Generate one chunk of students, consulting and updating the manifest if given."""
+        if manifest is None:
+            for success, message, _ in self._iter_generate(records, executor, workers, overwrite=False):
+                yield success, message
+            return
+        
+        fingerprint = self._manifest_fingerprint(self.encryption_key)
+        students = [
+            (str(record.get('Student ID', '')).strip(), str(record.get('Section', '')).strip())
+            for record in records
+        ]
+        statuses = [self._manifest_status(manifest, student_id, section, fingerprint) for student_id, section in students]
+        
+        generated = self._iter_generate(
+            [record for record, status in zip(records, statuses) if status is None],
+            executor,
+            workers,
+            overwrite=True,
+        )
+        
+        # Merge skipped and generated students back into row order
+        for (student_id, section), status in zip(students, statuses):
+            if status is not None:
+                yield False, status.format(student_id)
+                continue
+            
+            success, message, output_hash = next(generated)
+            if success:
+                relative_path = os.path.join(section, student_id, f"{student_id}.png")
+                previous = manifest.get(student_id)
+                if previous and previous['output_path'] != relative_path:
+                    # The student moved section; drop the QR code left at the old location
+                    try:
+                        os.remove(os.path.join(self.output_path, previous['output_path']))
+                    except OSError:
+                        pass
+                manifest.record(student_id, section, fingerprint, relative_path, output_hash)
+            yield success, message
+    
+    def _manifest_fingerprint(self, key: Optional[bytes]) -> str:
+        """Fingerprint of the inputs, besides the section, that a QR code depends on."""
+        fingerprint = QRManifest.key_fingerprint(key)
+        if self.compact_payload:
+            # Switching payload formats must regenerate every code
+            version = qr_payload.KEYED_PAYLOAD_VERSION if self.keyring is not None else qr_payload.PAYLOAD_VERSION
+            fingerprint += f"/v{version}"
+        return fingerprint
+    
+    def _manifest_status(self, manifest: QRManifest, student_id: str, section: str, fingerprint: str) -> Optional[str]:
+        """Decide whether a student's code can be kept.
+        
+        Returns:
+            None to (re)generate the code, otherwise the message for the skipped student
+        """
+        if manifest.is_current(student_id, section, fingerprint):
+            return "QR code up to date for {}"
+        if self.keyring is None or self._rotation_budget is None:
+            return None
+        
+        # Codes made with an older key that is still in the keyring remain
+        # valid, so only rotation_batch of them are regenerated per run
+        entry = manifest.get(student_id)
+        retained = {
+            self._manifest_fingerprint(self.keyring.get(key_id).key)
+            for key_id in self.keyring.key_ids if key_id != self.keyring.active_key_id
+        }
+        if entry is None or entry['section'] != section or entry['key_fingerprint'] not in retained:
+            return None
+        if self._rotation_budget > 0:
+            self._rotation_budget -= 1
+            return None
+        return "QR code still valid with an older key for {}"
     
-    def generate_batch_qr_codes(self) -> Tuple[int, int, list]:
+    def iter_batch_qr_codes(self, data: Union[pd.DataFrame, Iterable[pd.DataFrame]], workers: Optional[int] = 1,
+                            manifest: Optional[QRManifest] = None,
+                            rotation_batch: Optional[int] = None) -> Iterator[Tuple[bool, str]]:
+        """Generate QR codes for every student, yielding results as they finish.
+        
+        With more than one worker the rows are sharded across a process pool.
+        Results are always yielded in the same order as the input rows. When
+        given chunks (e.g. from read_excel_chunks), work starts on the first
+        chunk while the rest of the file is still being read.
+        
+        With a manifest, students whose section and encryption key are unchanged
+        since the last run are skipped without touching the filesystem, and all
+        other students are (re)generated.
+        
+        Args:
+            data: DataFrame of students as returned by read_excel, or an iterable of DataFrame chunks
+            workers: Number of worker processes. None uses all CPU cores, 1 runs serially.
+            manifest: Optional manifest of previously generated QR codes
+            rotation_batch: With a keyring, the maximum number of codes made with an
+                older key in the keyring to regenerate in this run. None regenerates all.
+            
+        Yields:
+            Tuple of (success: bool, message: str) for each student
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+        self._rotation_budget = rotation_batch
+        
+        if workers <= 1:
+            for chunk in chunks:
+                yield from self._iter_chunk(chunk.to_dict('records'), None, workers, manifest)
+            return
+        
+        # One pool for the whole run, shared by every chunk
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_batch_worker,
+            initargs=(
+                self.encryption_key,
+                self.output_path,
+                self.mask_pattern,
+                self.compact_payload,
+                self.keyring.to_dict() if self.keyring is not None else None,
+            ),
+        ) as executor:
+            for chunk in chunks:
+                yield from self._iter_chunk(chunk.to_dict('records'), executor, workers, manifest)
+    
+    def generate_batch_qr_codes(self, workers: Optional[int] = 1, incremental: bool = True,
+                                rotation_batch: Optional[int] = None) -> Tuple[int, int, list]:
         """Generate QR codes for all students in the Excel file.
         
+        The Excel file is streamed in chunks, so generation starts right away
+        and memory use does not grow with the size of the file.
+        
+        Args:
+            workers: Number of worker processes. None uses all CPU cores, 1 runs serially.
+            incremental: Track generated codes in a manifest in the output directory
+                and only regenerate students whose section or key changed.
+            rotation_batch: With a keyring and incremental runs, regenerate at most this
+                many codes made with an older key per run. None regenerates all of them.
+        
         Returns:
             Tuple of (success_count, failure_count, messages)
         """
         try:
-            # Read and validate Excel file
-            df = self.read_excel()
-            total_students = len(df)
-            
-            if total_students == 0:
-                return 0, 0, ["No valid student records found in the Excel file."]
-            
             success_count = 0
             failure_count = 0
             messages = []
             
-            # Process each student
-            for _, row in df.iterrows():
-                success, message = self.generate_qr_code(row)
-                if success:
-                    success_count += 1
-                else:
-                    failure_count += 1
-                messages.append(message)
+            manifest = QRManifest(self.output_path) if incremental else None
+            try:
+                # Process each student
+                for success, message in self.iter_batch_qr_codes(self.read_excel_chunks(), workers, manifest, rotation_batch):
+                    if success:
+                        success_count += 1
+                    else:
+                        failure_count += 1
+                    messages.append(message)
+            finally:
+                if manifest is not None:
+                    manifest.close()
+            
+            if not messages:
+                return 0, 0, ["No valid student records found in the Excel file."]
             
             return success_count, failure_count, messages
             
         except Exception as e:
             return 0, 1, [f"Error processing batch: {str(e)}"]
-        
-
-
-
@@ -0,0 +1,125 @@
+"""
+Manifest of generated QR codes for incremental batch runs.
+Tracks, per LRN, the inputs a QR code was generated from so re-runs can skip
+students whose section and encryption key have not changed.
+"""
+import os
+import hashlib
+import sqlite3
+from datetime import datetime
+from typing import Dict, Optional, List, Tuple
+
+
+class QRManifest:
+    """SQLite-backed manifest stored alongside the generated QR codes."""
+
+    FILENAME = 'qr_manifest.db'
+    FLUSH_SIZE = 500  # Pending entries written per transaction
+
+    def __init__(self, output_dir: str, filename: str = FILENAME):
+        """Open (or create) the manifest in the given output directory.
+
+        Args:
+            output_dir: Root output directory of the QR codes
+            filename: Name of the manifest database file
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        self.db_path = os.path.join(output_dir, filename)
+        self.conn = sqlite3.connect(self.db_path)
+        self.create_table()
+
+        # The whole manifest is held in memory so checks never hit the disk
+        cursor = self.conn.execute('SELECT lrn, section, key_fingerprint, output_path, output_hash FROM qr_manifest')
+        self.entries: Dict[str, Dict[str, str]] = {
+            lrn: {
+                'section': section,
+                'key_fingerprint': key_fingerprint,
+                'output_path': output_path,
+                'output_hash': output_hash,
+            }
+            for lrn, section, key_fingerprint, output_path, output_hash in cursor
+        }
+        self._pending: List[Tuple[str, str, str, str, str, str]] = []
+
+    def create_table(self) -> None:
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS qr_manifest (
+                lrn TEXT PRIMARY KEY,
+                section TEXT,
+                key_fingerprint TEXT,
+                output_path TEXT,
+                output_hash TEXT,
+                generated_at TEXT
+            )
+        ''')
+        self.conn.commit()
+
+    @staticmethod
+    def key_fingerprint(key: Optional[bytes]) -> str:
+        """Get a short, non-reversible fingerprint of an encryption key.
+
+        Args:
+            key: The encryption key, or None when encryption is disabled
+
+        Returns:
+            Hex fingerprint of the key, or an empty string if there is no key
+        """
+        if not key:
+            return ''
+        return hashlib.sha256(key).hexdigest()[:16]
+
+    def get(self, lrn: str) -> Optional[Dict[str, str]]:
+        """Get the manifest entry for a student, if any."""
+        return self.entries.get(lrn)
+
+    def is_current(self, lrn: str, section: str, key_fingerprint: str) -> bool:
+        """Check whether a student's QR code was generated from the same inputs.
+
+        Args:
+            lrn: Student LRN
+            section: Student's current section
+            key_fingerprint: Fingerprint of the current encryption key
+
+        Returns:
+            True if the recorded QR code is still valid
+        """
+        entry = self.entries.get(lrn)
+        return (entry is not None
+                and entry['section'] == section
+                and entry['key_fingerprint'] == key_fingerprint)
+
+    def record(self, lrn: str, section: str, key_fingerprint: str, output_path: str, output_hash: str) -> None:
+        """Record a freshly generated QR code.
+
+        Entries are written in batches; call flush() or close() to persist the rest.
+        """
+        self.entries[lrn] = {
+            'section': section,
+            'key_fingerprint': key_fingerprint,
+            'output_path': output_path,
+            'output_hash': output_hash,
+        }
+        self._pending.append((lrn, section, key_fingerprint, output_path, output_hash, datetime.now().isoformat()))
+        if len(self._pending) >= self.FLUSH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write pending entries to the manifest database in one transaction."""
+        if not self._pending:
+            return
+        with self.conn:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO qr_manifest (lrn, section, key_fingerprint, output_path, output_hash, generated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', self._pending)
+        self._pending = []
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self) -> 'QRManifest':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
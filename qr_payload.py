@@ -0,0 +1,109 @@
+"""
+Compact binary payload format for encrypted student QR codes.
+
+Layout (26 bytes, fits a version 2 QR code at error correction M):
+
+    offset  size  field
+    0       1     header: format version in the high 4 bits; the low 4 bits are
+                  reserved (0) in version 1 and hold the key ID in version 2
+    1       12    AES-GCM nonce
+    13      8     AES-GCM tag, truncated to 64 bits
+    21      5     ciphertext of the LRN, a 12-digit number packed as a 40-bit big-endian integer
+
+The header byte is passed to AES-GCM as associated data, so it is authenticated
+along with the LRN. See qr_payload_format.md for the scanner-side spec.
+"""
+from typing import Optional, Tuple
+
+PAYLOAD_VERSION = 1  # Payload without a key ID
+KEYED_PAYLOAD_VERSION = 2  # Payload with a key ID in the header
+MAX_KEY_ID = 15
+HEADER_SIZE = 1
+NONCE_SIZE = 12
+TAG_SIZE = 8  # Truncated GCM tag; forging one still takes ~2**63 scans on average
+LRN_SIZE = 5
+LRN_DIGITS = 12
+PAYLOAD_SIZE = HEADER_SIZE + NONCE_SIZE + TAG_SIZE + LRN_SIZE
+
+
+def encode_header(key_id: Optional[int] = None) -> bytes:
+    """Build the header byte, using the keyed version when a key ID is given.
+
+    Raises:
+        ValueError: If the key ID is out of range
+    """
+    if key_id is None:
+        return bytes([PAYLOAD_VERSION << 4])
+    if not 0 <= key_id <= MAX_KEY_ID:
+        raise ValueError(f"Key ID must be between 0 and {MAX_KEY_ID}.")
+    return bytes([(KEYED_PAYLOAD_VERSION << 4) | key_id])
+
+
+def decode_header(payload: bytes) -> Tuple[int, Optional[int]]:
+    """Get the format version and key ID from a payload's header byte.
+
+    Returns:
+        Tuple of (version, key_id); key_id is None for version 1 payloads
+
+    Raises:
+        ValueError: If the payload is empty or the header is not supported
+    """
+    if not payload:
+        raise ValueError("Payload is empty.")
+    version, low_bits = payload[0] >> 4, payload[0] & 0x0F
+    if version == PAYLOAD_VERSION and low_bits == 0:
+        return version, None
+    if version == KEYED_PAYLOAD_VERSION:
+        return version, low_bits
+    raise ValueError("Unsupported payload header.")
+
+
+def is_compact_payload(payload: bytes) -> bool:
+    """Check whether a payload uses the compact format rather than the legacy one.
+
+    Legacy payloads are nonce + 16-byte tag + ciphertext of the LRN string, so
+    they are always longer than a compact payload.
+    """
+    if len(payload) != PAYLOAD_SIZE:
+        return False
+    try:
+        decode_header(payload)
+    except ValueError:
+        return False
+    return True
+
+
+def pack_lrn(lrn: str) -> bytes:
+    """Pack a 12-digit LRN into 5 bytes.
+
+    Raises:
+        ValueError: If the LRN is not exactly 12 digits
+    """
+    lrn = str(lrn).strip()
+    if len(lrn) != LRN_DIGITS or not lrn.isdigit():
+        raise ValueError(f"LRN must be exactly {LRN_DIGITS} digits: {lrn}")
+    return int(lrn).to_bytes(LRN_SIZE, 'big')
+
+
+def unpack_lrn(packed: bytes) -> str:
+    """Unpack a 5-byte LRN back into its 12-digit string."""
+    if len(packed) != LRN_SIZE:
+        raise ValueError(f"Packed LRN must be {LRN_SIZE} bytes.")
+    value = int.from_bytes(packed, 'big')
+    if value >= 10 ** LRN_DIGITS:
+        raise ValueError("Packed LRN is out of range.")
+    return str(value).zfill(LRN_DIGITS)
+
+
+def split_payload(payload: bytes) -> Tuple[bytes, bytes, bytes, bytes]:
+    """Split a compact payload into (header, nonce, tag, ciphertext).
+
+    Raises:
+        ValueError: If the payload size or header is not supported
+    """
+    if len(payload) != PAYLOAD_SIZE:
+        raise ValueError(f"Compact payload must be {PAYLOAD_SIZE} bytes.")
+    decode_header(payload)
+    nonce_end = HEADER_SIZE + NONCE_SIZE
+    tag_end = nonce_end + TAG_SIZE
+    return payload[:HEADER_SIZE], payload[HEADER_SIZE:nonce_end], payload[nonce_end:tag_end], payload[tag_end:]
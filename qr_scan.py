@@ -0,0 +1,78 @@
+"""
+Reading encrypted QR payloads back with zbar.
+pyzbar doesn't enable zbar's binary mode, so zbar returns byte-mode QR data
+as UTF-8 text after guessing its original encoding (UTF-8, Shift-JIS or
+Latin-1). Binary payloads have to be re-encoded to get the raw bytes back;
+authenticated decryption tells which guess was right.
+"""
+from typing import List, Optional, Union
+from PIL import Image
+from qr_crypto import QRCodeCrypto, QRKeyring
+
+try:
+    from pyzbar.pyzbar import decode as zbar_decode
+except ImportError:
+    # pyzbar is missing or can't find the zbar shared library
+    zbar_decode = None
+
+# Encodings zbar may have read binary data as, most likely first
+ZBAR_TEXT_ENCODINGS = ('latin-1', 'shift_jis', 'cp932')
+# iconv's Shift-JIS maps 0x5C and 0x7E to the yen sign and overline, Python's to ASCII
+SJIS_ASCII_VARIANTS = {0x00A5: '\\', 0x203E: '~'}
+
+
+def decode_qr_image(img: Image.Image) -> Optional[bytes]:
+    """Decode the first QR code in an image, returning the data as zbar reports it, or None."""
+    results = zbar_decode(img.convert('L'))
+    return results[0].data if results else None
+
+
+def payload_candidates(data: bytes) -> List[bytes]:
+    """
+    Possible raw payloads behind the data zbar returned for a byte-mode QR code.
+
+    Returns:
+        The data itself first, then the bytes it was transcoded from under each
+        encoding zbar may have guessed
+    """
+    candidates = [data]
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        return candidates  # Not transcoded, e.g. zbar built with binary mode on
+
+    for encoding in ZBAR_TEXT_ENCODINGS:
+        variants = [text]
+        if encoding != 'latin-1':
+            variants.append(text.translate(SJIS_ASCII_VARIANTS))
+        for variant in variants:
+            try:
+                raw = variant.encode(encoding)
+            except UnicodeEncodeError:
+                continue
+            if raw not in candidates:
+                candidates.append(raw)
+    return candidates
+
+
+def decrypt_scanned(crypto: Union[QRCodeCrypto, QRKeyring], data: bytes) -> str:
+    """
+    Decrypt the data zbar read from a QR code, undoing its text transcoding.
+
+    Args:
+        crypto: The key or keyring the code was made with
+        data: Data of the decoded QR code, as returned by decode_qr_image
+
+    Returns:
+        The decrypted LRN
+
+    Raises:
+        ValueError: If no candidate payload decrypts
+    """
+    error = None
+    for payload in payload_candidates(data):
+        try:
+            return crypto.decrypt_payload(payload)
+        except ValueError as e:
+            error = e
+    raise error
@@ -1,20 +1,134 @@
 from datetime import datetime
 from collections import defaultdict
 import calendar
+import itertools
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 from dateutil.rrule import rrule, MONTHLY
+import numpy as np
 import openpyxl
 import pandas as pd
 from data_importer import FirestoreDataImporter
+from attendance_cache import AttendanceCache
+from attendance_snapshot import records_to_frame, save_snapshot, load_snapshot
+
+try:
+    import xlsxwriter
+except ImportError:
+    # Fall back to openpyxl's write-only mode if xlsxwriter is not installed
+    xlsxwriter = None
+
+# Columns identifying a student in the report, as named in the attendance records
+STUDENT_COLUMNS = ['lrn', 'lastName', 'firstName', 'studentYear', 'studentSection']
+
+
+def _get_days_for_month(month_date: datetime) -> list[datetime]:
+    """Gets all days for a specific month."""
+    _, num_days = calendar.monthrange(month_date.year, month_date.month)
+    return [datetime(month_date.year, month_date.month, day) for day in range(1, num_days + 1)]
+
+
+def _build_month_report(month_df: pd.DataFrame, month_date: datetime,
+                        roster: pd.DataFrame) -> tuple[list[datetime], pd.DataFrame | None]:
+    """
+    Builds the report rows for one month.
+
+    roster holds STUDENT_COLUMNS for every student in report order.
+
+    Returns:
+        Tuple of (weekdays_in_month, month_report). month_report is None if
+        the month has no weekdays.
+    """
+    weekdays_in_month = [d for d in _get_days_for_month(month_date) if d.weekday() < 5]
+    weekday_days = [d.day for d in weekdays_in_month]
+
+    if not weekdays_in_month:
+        return weekdays_in_month, None
+
+    # Boolean absence matrix: one row per student, one column per weekday
+    absences = month_df[month_df['isAbsent'] == True]
+    if absences.empty:
+        absent = np.zeros((len(roster), len(weekday_days)), dtype=bool)
+    else:
+        absence_pivot = pd.crosstab(absences['lrn'], absences['timestamp'].dt.day) > 0
+        absent = absence_pivot.reindex(
+            index=roster['lrn'], columns=weekday_days, fill_value=False
+        ).to_numpy(dtype=bool)
+
+    # Calculate totals on the boolean matrix, then map absences to 'A'
+    total_absences = absent.sum(axis=1)
+    month_report = pd.concat([
+        roster,
+        # Object dtype keeps None (an empty cell) instead of NaN for present days
+        pd.DataFrame(np.where(absent, 'A', None), columns=weekday_days, dtype=object),
+        pd.DataFrame({
+            'Total Absences': total_absences,
+            'Total Present': len(weekday_days) - total_absences,
+        }),
+    ], axis=1)
+    return weekdays_in_month, month_report
+
+
+# Per-process roster used by the parallel report mode, sent once per worker
+_worker_roster: pd.DataFrame | None = None
+
+
+def _init_report_worker(roster: pd.DataFrame) -> None:
+    """Initialize a report worker process with the student roster."""
+    global _worker_roster
+    _worker_roster = roster
+
+
+def _build_month_report_in_worker(month_df: pd.DataFrame, month_date: datetime) -> tuple[list[datetime], pd.DataFrame | None]:
+    """Build one month's report inside a report worker process."""
+    return _build_month_report(month_df, month_date, _worker_roster)
+
+
+class ReportWorkbookWriter:
+    """
+    Streams report sheets into a workbook one row at a time.
+
+    Uses xlsxwriter in constant-memory mode when it is installed, otherwise an
+    openpyxl write-only workbook. Either way rows are flushed to disk as they
+    are written instead of being kept as cell objects, so memory use stays at
+    about one row regardless of the report size.
+    """
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        if xlsxwriter is not None:
+            self.workbook = xlsxwriter.Workbook(output_path, {'constant_memory': True})
+        else:
+            self.workbook = openpyxl.Workbook(write_only=True)
+
+    def write_sheet(self, title: str, header_rows: list[list], rows) -> None:
+        """Appends a sheet with the given header rows followed by the data rows."""
+        if xlsxwriter is not None:
+            sheet = self.workbook.add_worksheet(title)
+            for row_num, row in enumerate(itertools.chain(header_rows, rows)):
+                sheet.write_row(row_num, 0, row)
+        else:
+            sheet = self.workbook.create_sheet(title=title)
+            for row in itertools.chain(header_rows, rows):
+                sheet.append(row)
+
+    def save(self) -> None:
+        if xlsxwriter is not None:
+            self.workbook.close()
+        else:
+            self.workbook.save(self.output_path)
+
 
 class ExcelReportGenerator:
     """
     Generates an Excel attendance report by fetching data from Firestore.
     The logic is a Python port of the Dart ReportManager.
     """
-    def __init__(self, db_client):
+    def __init__(self, db_client, master_list_db: str = 'master_list.db'):
         if not db_client:
             raise ValueError("A valid Firestore database client is required.")
         self.db = db_client
+        self.master_list_db = master_list_db
 
 
     def _get_months_between(self, start_date: datetime, end_date: datetime) -> dict[str, datetime]:
@@ -26,127 +140,221 @@ class ExcelReportGenerator:
             months[month_key] = dt
         return months
 
-    def _get_days_for_month(self, month_date: datetime) -> list[datetime]:
-        """Gets all days for a specific month."""
-        _, num_days = calendar.monthrange(month_date.year, month_date.month)
-        return [datetime(month_date.year, month_date.month, day) for day in range(1, num_days + 1)]
+    def _load_roster(self, section: str | None = None) -> pd.DataFrame:
+        """Loads the student roster from the local master_list table, indexed by LRN."""
+        if not os.path.exists(self.master_list_db):
+            raise ValueError("Local master list not found. Import the master list first.")
+
+        query = """
+            SELECT lrn, last_name AS lastName, first_name AS firstName,
+                   student_year AS studentYear, section AS studentSection
+            FROM master_list
+        """
+        params = ()
+        if section:
+            query += " WHERE section = ?"
+            params = (section,)
+        query += " ORDER BY section, last_name, first_name"
+
+        conn = sqlite3.connect(self.master_list_db)
+        try:
+            roster = pd.read_sql_query(query, conn, params=params)
+        finally:
+            conn.close()
+
+        if roster.empty:
+            raise ValueError("No students found in the local master list.")
+        roster['lrn'] = roster['lrn'].astype(str)
+        return roster.set_index('lrn')
+
+    def _month_header_rows(self, weekdays_in_month: list[datetime]) -> list[list]:
+        """Builds the two header rows of a month sheet: day letters, then column names."""
+        prefix_cols = ['LRN', 'Last Name', 'First Name', 'Year', 'Section']
+        day_letters = [d.strftime('%a') for d in weekdays_in_month]
+        day_numbers = [str(d.day) for d in weekdays_in_month]
+        suffix_cols = ['Total Absences', 'Total Present']
+
+        header_top = [None] * len(prefix_cols) + day_letters + [None] * len(suffix_cols)
+        header_bottom = prefix_cols + day_numbers + suffix_cols
+        return [header_top, header_bottom]
+
+    def _partition_by_month(self, df: pd.DataFrame, month_dates) -> list[pd.DataFrame]:
+        """
+        Splits the attendance records into one DataFrame per month.
 
-    def _generate_excel_with_pandas(self, df: pd.DataFrame, start_date: datetime, end_date: datetime, output_path: str):
+        The records are sorted by a year/month key once, and each month is a
+        contiguous slice found with searchsorted, instead of re-scanning the
+        whole DataFrame for every month. Only the columns needed to place
+        absences are kept.
+        """
+        timestamps = df['timestamp']
+        month_keys = (timestamps.dt.year * 12 + timestamps.dt.month - 1).to_numpy()
+        order = np.argsort(month_keys, kind='stable')
+        sorted_keys = month_keys[order]
+        records = df[['lrn', 'timestamp', 'isAbsent']].take(order)
+
+        month_dfs = []
+        for month_date in month_dates:
+            key = month_date.year * 12 + month_date.month - 1
+            start, stop = np.searchsorted(sorted_keys, [key, key + 1])
+            month_dfs.append(records.iloc[start:stop])
+        return month_dfs
+
+    def _generate_excel_with_pandas(self, df: pd.DataFrame, start_date: datetime, end_date: datetime, output_path: str,
+                                    student_info: pd.DataFrame | None = None, workers: int | None = 1):
         """
         Generates an Excel report from a DataFrame using pandas.
         This approach is more efficient for data manipulation and produces cleaner code.
+
+        If student_info (indexed by LRN) is not given, the roster is taken from
+        the students appearing in the attendance records, ordered like the
+        master list roster (section, last name, first name). With more than one
+        worker (None uses all CPU cores), months are built in a process pool.
         """
         months = self._get_months_between(start_date, end_date)
         if not months:
             raise ValueError("Date range does not cover any full months.")
 
         # Get unique student information
-        student_info = df[['lrn', 'lastName', 'firstName', 'studentYear', 'studentSection']].drop_duplicates(subset='lrn')
-        student_info = student_info.set_index('lrn')
-
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            for month_key, month_date in months.items():
-                month_df = df[(df['timestamp'].dt.year == month_date.year) & (df['timestamp'].dt.month == month_date.month)].copy()
-                
-                weekdays_in_month = [d for d in self._get_days_for_month(month_date) if d.weekday() < 5]
-                weekday_days = [d.day for d in weekdays_in_month]
-
-                if not weekdays_in_month:
-                    pd.DataFrame(columns=["No weekdays in this month."]).to_excel(writer, sheet_name=month_key, index=False)
+        if student_info is None:
+            student_info = df[STUDENT_COLUMNS].drop_duplicates(subset='lrn')
+            student_info = student_info.sort_values(['studentSection', 'lastName', 'firstName'], kind='stable')
+            student_info = student_info.set_index('lrn')
+
+        # Missing student details become empty cells rather than NaN
+        roster = student_info.reset_index()[STUDENT_COLUMNS].astype(object)
+        roster = roster.where(roster.notna(), None)
+
+        month_dfs = self._partition_by_month(df, months.values())
+
+        executor = None
+        if workers is not None and workers <= 1:
+            month_reports = map(_build_month_report, month_dfs, months.values(), itertools.repeat(roster))
+        else:
+            # Months are independent, so they are built concurrently and handed
+            # to the single writer in calendar order as they complete
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_report_worker,
+                initargs=(roster,),
+            )
+            month_reports = executor.map(_build_month_report_in_worker, month_dfs, months.values())
+
+        try:
+            writer = ReportWorkbookWriter(output_path)
+            for month_key, (weekdays_in_month, month_report) in zip(months, month_reports):
+                if month_report is None:
+                    writer.write_sheet(month_key, [["No weekdays in this month."]], [])
                     continue
 
-                # Create the main structure of the report for this month with all students
-                month_report = student_info.copy()
-
-                # Add columns for each weekday, initialized to empty string
-                for day in weekday_days:
-                    month_report[day] = ''
-
-                if not month_df.empty:
-                    month_df['day'] = month_df['timestamp'].dt.day
-                    # Get only absent records
-                    absences = month_df[month_df['isAbsent'] == True]
-                    # Create a pivot for absences
-                    if not absences.empty:
-                        absence_pivot = absences.pivot_table(index='lrn', columns='day', values='isAbsent', aggfunc='any')
-                        
-                        # Map absences ('A') to the report
-                        for lrn, row in absence_pivot.iterrows():
-                            if lrn in month_report.index:
-                                for day, is_absent in row.items():
-                                    if is_absent and day in weekday_days:
-                                        month_report.loc[lrn, day] = 'A'
-
-                # Calculate totals
-                month_report['Total Absences'] = (month_report[weekday_days] == 'A').sum(axis=1)
-                month_report['Total Present'] = len(weekday_days) - month_report['Total Absences']
-                
-                month_report.reset_index(inplace=True)
-                
-                # Reorder columns to match header
-                month_report = month_report[['lrn', 'lastName', 'firstName', 'studentYear', 'studentSection'] + weekday_days + ['Total Absences', 'Total Present']]
-
-                # Write the DataFrame data without the header
-                month_report.to_excel(writer, sheet_name=month_key, index=False, header=False, startrow=2)
-
-                # Now, write the headers manually using openpyxl
-                sheet = writer.sheets[month_key]
-                
-                prefix_cols = ['LRN', 'Last Name', 'First Name', 'Year', 'Section']
-                day_letters = [d.strftime('%a') for d in weekdays_in_month]
-                day_numbers = [str(d.day) for d in weekdays_in_month]
-                suffix_cols = ['Total Absences', 'Total Present']
-
-                header_top = [''] * len(prefix_cols) + day_letters + [''] * len(suffix_cols)
-                header_bottom = prefix_cols + day_numbers + suffix_cols
-
-                # Write the top header row (day letters)
-                for col_num, cell_value in enumerate(header_top, 1):
-                    sheet.cell(row=1, column=col_num, value=cell_value)
-
-                # Write the bottom header row (main headers)
-                for col_num, cell_value in enumerate(header_bottom, 1):
-                    sheet.cell(row=2, column=col_num, value=cell_value)
-
-    def generate_report(self, start_date: datetime, end_date: datetime, output_path: str, section: str | None = None):
+                writer.write_sheet(
+                    month_key,
+                    self._month_header_rows(weekdays_in_month),
+                    month_report.itertuples(index=False, name=None),
+                )
+            writer.save()
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def generate_report(self, start_date: datetime, end_date: datetime, output_path: str, section: str | None = None,
+                        absences_only: bool = False, workers: int | None = 1, cache: AttendanceCache | None = None,
+                        snapshot_path: str | None = None):
         """
         Main method to generate the complete Excel report.
         Orchestrates fetching data and writing the file.
+
+        With absences_only, only the absence records are fetched from Firestore
+        (with a field mask) and the student roster comes from the local
+        master_list table, which cuts the transfer volume to a fraction.
+        workers sets how many processes build the month sheets (None uses all
+        CPU cores).
+        With a cache, only records newer than the last sync are fetched and
+        already-cached months are read from disk. The cache holds full records,
+        so it is not used in absences_only mode.
+        With snapshot_path, the fetched records are also saved as a columnar
+        snapshot that generate_report_from_snapshot can rebuild reports from.
         """
         try:
             print("Fetching student records...")
-            records = FirestoreDataImporter(self.db).import_data(start_date, end_date, section)
-
-            if not records:
+            importer = FirestoreDataImporter(self.db)
+            if absences_only:
+                student_info = self._load_roster(section)
+                records_list = [doc.to_dict() for doc in importer.import_absences(start_date, end_date, section)]
+            elif cache is not None:
+                student_info = None
+                records_list = cache.get_records(importer, start_date, end_date, section)
+            else:
+                student_info = None
+                records_list = [doc.to_dict() for doc in importer.import_data(start_date, end_date, section)]
+
+            if not records_list and student_info is None:
                 print("No records found for the given date range and section.")
                 return
 
             # Convert records to a pandas DataFrame
-            records_list = [doc.to_dict() for doc in records]
-            df = pd.DataFrame(records_list)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
+            if absences_only:
+                df = pd.DataFrame(records_list, columns=None if records_list else FirestoreDataImporter.ABSENCE_FIELDS)
+                df['timestamp'] = pd.to_datetime(df['timestamp'])
+                df['lrn'] = df['lrn'].astype(str)
+            else:
+                df = records_to_frame(records_list)
+                if snapshot_path:
+                    save_snapshot(df, snapshot_path)
+                    print(f"Attendance snapshot saved to {snapshot_path}")
 
+            self._write_report(df, start_date, end_date, output_path, student_info, workers, absences_only)
 
-            # The DataFrame can now be used for statistics, for example:
-            stats_generator = StatisticsGenerator(df)
-            stats_generator.generate_statistics()
 
-            print("Generating Excel report using pandas...")
-            self._generate_excel_with_pandas(df, start_date, end_date, output_path)
-            print("Report generated successfully.")
+        except Exception as e:
+            print(f"Error generating report: {e}")
+            raise
 
+    def generate_report_from_snapshot(self, snapshot_path: str, start_date: datetime, end_date: datetime,
+                                      output_path: str, section: str | None = None, workers: int | None = 1):
+        """
+        Generates the Excel report offline from an attendance snapshot saved by
+        generate_report, without contacting Firestore.
+        """
+        try:
+            print(f"Loading attendance snapshot {snapshot_path}...")
+            df = load_snapshot(snapshot_path, start_date, end_date, section)
+            if df.empty:
+                print("No records found for the given date range and section.")
+                return
+
+            self._write_report(df, start_date, end_date, output_path, None, workers)
 
         except Exception as e:
             print(f"Error generating report: {e}")
             raise
 
+    def _write_report(self, df: pd.DataFrame, start_date: datetime, end_date: datetime, output_path: str,
+                      student_info: pd.DataFrame | None, workers: int | None, absences_only: bool = False):
+        # The DataFrame can now be used for statistics, for example:
+        if not df.empty:
+            stats_generator = StatisticsGenerator(df, absences_only=absences_only)
+            stats_generator.generate_statistics()
+
+        print("Generating Excel report using pandas...")
+        self._generate_excel_with_pandas(df, start_date, end_date, output_path, student_info, workers)
+        print("Report generated successfully.")
+
 
 
 class StatisticsGenerator:
-    def __init__(self, df: pd.DataFrame):
+    def __init__(self, df: pd.DataFrame, absences_only: bool = False):
         if df.empty:
             raise ValueError("DataFrame cannot be empty.")
         self.df = df
+        # Set when df holds only the absence records, so presents can't be counted
+        self.absences_only = absences_only
+
+    @classmethod
+    def from_snapshot(cls, snapshot_path: str, start_date: datetime | None = None, end_date: datetime | None = None,
+                      section: str | None = None) -> 'StatisticsGenerator':
+        """Creates a StatisticsGenerator from an attendance snapshot."""
+        return cls(load_snapshot(snapshot_path, start_date, end_date, section))
 
     def generate_statistics(self):
         """
@@ -159,17 +367,20 @@ class StatisticsGenerator:
             print("'isAbsent' column not found. Cannot generate statistics.")
             return
             
-        # Total records
-        total_records = len(self.df)
-        print(f"Total attendance records: {total_records}")
-
         # Absence/Presence count
         attendance_counts = self.df['isAbsent'].value_counts()
         absences = attendance_counts.get(True, 0)
         presents = attendance_counts.get(False, 0)
-        
-        print(f"Total absences: {absences}")
-        print(f"Total presents: {presents}")
+
+        if self.absences_only:
+            print(f"Total absences: {absences}")
+        else:
+            # Total records
+            total_records = len(self.df)
+            print(f"Total attendance records: {total_records}")
+
+            print(f"Total absences: {absences}")
+            print(f"Total presents: {presents}")
 
         # Absences by year level
         if 'studentYear' in self.df.columns:
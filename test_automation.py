@@ -2,11 +2,150 @@ import unittest
 from unittest.mock import MagicMock, patch
 import os
 import pandas as pd
+import hashlib
+import re
 import shutil
-from data_importer import ExcelDataImporter
-from image_manager import DriveImageManager as ImageManager
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
+from Crypto.Cipher import AES
+from googleapiclient.errors import HttpError
+from data_importer import ExcelDataImporter, MasterListManager
+from excel_reader import iter_excel_chunks
+from firestore_writer import FirestoreBulkWriter
+from google.api_core import exceptions as api_exceptions
+from image_manager import DriveImageManager as ImageManager, UploadSessionLog
+from image_normalizer import ImageNormalizer
+from drive_folder_cache import DriveFolderCache
 from key_manager import KeyManager
-from qr_generator import QRCodeGenerator
+from qr_crypto import QRCodeCrypto, QRKeyring
+from qr_benchmark import run_benchmark
+import qr_audit
+import qr_scan
+import numpy as np
+import qrcode
+from PIL import Image
+from qr_generator import QRBatchEncoder, QRCodeGenerator, render_qr_image
+
+class FakeDriveRequest:
+    def __init__(self, service, action):
+        self.service = service
+        self.action = action
+
+    def execute(self):
+        with self.service.lock:
+            if self.service.fail_statuses:
+                status = self.service.fail_statuses.pop(0)
+                raise HttpError(httplib2.Response({'status': status}), b'fake failure')
+            return self.action()
+
+
+class FakeDriveFiles:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, q='', fields=None, pageSize=100, pageToken=None, **kwargs):
+        name = re.search(r"name = '([^']*)'", q)
+        parent = re.search(r"'([^']*)' in parents", q)
+        folders_only = 'mimeType' in q
+
+        def action():
+            self.service.calls['list'] += 1
+            files = [
+                {'id': file_id, **meta} for file_id, meta in self.service.files_by_id.items()
+                if not meta.get('trashed') and (not name or meta['name'] == name.group(1))
+                and (not parent or parent.group(1) in meta['parents'])
+                and (not folders_only or meta['mimeType'] == 'application/vnd.google-apps.folder')
+            ]
+            start = int(pageToken or 0)
+            end = start + min(pageSize, self.service.max_page_size)
+            page = {'files': files[start:end]}
+            if end < len(files):
+                page['nextPageToken'] = str(end)
+            return page
+        return FakeDriveRequest(self.service, action)
+
+    def get(self, fileId, fields=None):
+        def action():
+            self.service.calls['get'] += 1
+            if fileId not in self.service.files_by_id:
+                raise HttpError(httplib2.Response({'status': 404}), b'not found')
+            return {'id': fileId, 'trashed': self.service.files_by_id[fileId].get('trashed', False)}
+        return FakeDriveRequest(self.service, action)
+
+    def update(self, fileId, body=None, media_body=None, fields=None):
+        def action():
+            self.service.calls['update'] += 1
+            self.service.files_by_id[fileId].update(body or {})
+            if media_body is not None:
+                with open(media_body._filename, 'rb') as f:
+                    content = f.read()
+                self.service.files_by_id[fileId]['md5Checksum'] = hashlib.md5(content).hexdigest()
+                self.service.files_by_id[fileId]['size'] = str(len(content))
+            return {'id': fileId}
+        return FakeDriveRequest(self.service, action)
+
+    def create(self, body, media_body=None, fields=None):
+        def action():
+            self.service.calls['create'] += 1
+            if body['name'] in self.service.reject_names:
+                raise HttpError(httplib2.Response({'status': 403}), b'forbidden')
+            file_id = f"id{len(self.service.files_by_id)}"
+            meta = {'name': body['name'], 'parents': body.get('parents', []),
+                    'mimeType': body.get('mimeType', 'image/png')}
+            if media_body is not None:
+                with open(media_body._filename, 'rb') as f:
+                    content = f.read()
+                meta['md5Checksum'] = hashlib.md5(content).hexdigest()
+                meta['size'] = str(len(content))
+            self.service.files_by_id[file_id] = meta
+            return {'id': file_id}
+        return FakeDriveRequest(self.service, action)
+
+
+class FakeDriveBatch:
+    """Runs its requests one by one, reporting each through the callback like BatchHttpRequest."""
+
+    def __init__(self, callback, service=None):
+        self.callback = callback
+        self.service = service
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        if self.service is not None:
+            with self.service.lock:
+                self.service.calls['batch'] += 1
+                self.service.batch_sizes.append(len(self.requests))
+        for request_id, request in self.requests:
+            try:
+                response, exception = request.execute(), None
+            except HttpError as e:
+                response, exception = None, e
+            self.callback(request_id, response, exception)
+
+
+class FakeDriveService:
+    """In-memory stand-in for the Drive v3 service, shared by every thread."""
+
+    def __init__(self, fail_statuses=None, reject_names=(), max_page_size=1000):
+        self.lock = threading.Lock()
+        self.files_by_id = {}
+        self.calls = {'list': 0, 'get': 0, 'create': 0, 'update': 0, 'batch': 0}
+        self.batch_sizes = []
+        self.fail_statuses = list(fail_statuses or [])  # Statuses raised by the next requests
+        self.reject_names = set(reject_names)  # File names whose upload is refused
+        self.max_page_size = max_page_size
+
+    def files(self):
+        return FakeDriveFiles(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeDriveBatch(callback, self)
+
 
 class TestAutomation(unittest.TestCase):
 
@@ -63,6 +202,76 @@ class TestAutomation(unittest.TestCase):
         mock_batch.commit.assert_called()
         print("Masterlist upload test passed.")
 
+    def test_masterlist_reimport_upserts(self):
+        print("\nTesting Masterlist Bulk Import...")
+        db_path = os.path.join("test_excel", "master_list.db")
+        importer = ExcelDataImporter(self.excel_path, db_path=db_path)
+        importer.import_master_list()
+
+        # Re-importing an updated list updates the student instead of failing on the LRN
+        df = pd.read_excel(self.excel_path)
+        df['SECTION'] = 'Section B'
+        df.to_excel(self.excel_path, index=False)
+        importer.import_master_list()
+
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute("SELECT lrn, section FROM master_list").fetchall()
+        finally:
+            conn.close()
+        self.assertEqual(rows, [('123456789012', 'Section B')])
+        print("Masterlist bulk import test passed.")
+
+    @patch('data_importer.db')
+    def test_masterlist_differential_sync(self, mock_db):
+        print("\nTesting Masterlist Differential Sync...")
+        mock_batch = MagicMock()
+        mock_db.batch.return_value = mock_batch
+
+        db_path = os.path.join("test_excel", "master_list.db")
+        importer = ExcelDataImporter(self.excel_path, db_path=db_path)
+        importer.import_master_list()
+        manager = MasterListManager(db_path)
+
+        report = manager.sync_to_firestore()
+        self.assertEqual(report.inserted, ['123456789012'])
+        self.assertEqual(mock_batch.set.call_count, 1)
+
+        # Nothing changed, so nothing is sent
+        report = manager.sync_to_firestore()
+        self.assertEqual((report.total_sent, report.unchanged), (0, 1))
+        self.assertEqual(mock_batch.set.call_count, 1)
+
+        df = pd.read_excel(self.excel_path)
+        df['ADVISER'] = 'Ms. Cruz'
+        df.to_excel(self.excel_path, index=False)
+        importer.import_master_list()
+        self.assertEqual(manager.sync_to_firestore().updated, ['123456789012'])
+
+        manager.delete_local_records()
+        self.assertEqual(manager.sync_to_firestore().deleted, ['123456789012'])
+        mock_batch.delete.assert_called_once()
+        print("Masterlist differential sync test passed.")
+
+    def test_bulk_writer_retries_contention(self):
+        print("\nTesting Firestore Bulk Writer...")
+        mock_db = MagicMock()
+        mock_batch = MagicMock()
+        mock_db.batch.return_value = mock_batch
+        # The first commit hits contention, every later one succeeds
+        mock_batch.commit.side_effect = [api_exceptions.Aborted("contention")] + [None] * 10
+
+        committed = []
+        with FirestoreBulkWriter(mock_db, batch_size=2, max_in_flight=2, backoff_base=0,
+                                 on_commit=committed.append) as writer:
+            for i in range(5):
+                writer.set(MagicMock(), {'lrn': str(i)})
+
+        self.assertEqual(writer.committed, 5)
+        self.assertEqual(sorted(len(ops) for ops in committed), [1, 2, 2])
+        self.assertEqual(mock_batch.commit.call_count, 4)
+        print("Firestore bulk writer test passed.")
+
     @patch('image_manager.build')
     @patch('image_manager.service_account.Credentials')
     def test_image_upload(self, mock_creds, mock_build):
@@ -75,6 +284,7 @@ class TestAutomation(unittest.TestCase):
         # Mock Files Resource
         mock_files = MagicMock()
         mock_service.files.return_value = mock_files
+        mock_service.new_batch_http_request.side_effect = lambda callback=None: FakeDriveBatch(callback)
         
         # Mock List (Search) - Return empty list first (folder doesn't exist) then folder id
         # We need to handle multiple calls to list()
@@ -112,6 +322,191 @@ class TestAutomation(unittest.TestCase):
             if os.path.exists("credentials.json"):
                 os.remove("credentials.json")
 
+    def test_concurrent_resumable_image_upload(self):
+        print("\nTesting Concurrent Image Upload...")
+        for section in ('Section A', 'Section B'):
+            os.makedirs(os.path.join("test_images", section), exist_ok=True)
+            for i in range(3):
+                with open(os.path.join("test_images", section, f"{section[-1]}{i}.png"), "wb") as f:
+                    f.write(os.urandom(64))
+
+        # Rate limiting is retried; a refused file fails without stopping the run
+        service = FakeDriveService(fail_statuses=[429, 503], reject_names={'B2.png'})
+        manager = ImageManager("test_images", max_workers=3, backoff_base=0, service_factory=lambda: service)
+        report = manager.upload_images()
+        self.assertEqual((report.uploaded, report.failed), (6, 1))
+
+        # The next run only retries what didn't make it
+        service.reject_names.clear()
+        creates_before = service.calls['create']
+        manager = ImageManager("test_images", backoff_base=0, service_factory=lambda: service)
+        report = manager.upload_images()
+        self.assertEqual((report.uploaded, report.skipped, report.failed), (1, 6, 0))
+        self.assertEqual(service.calls['create'] - creates_before, 1)
+
+        # A complete run drops the session log, so files trashed on Drive are uploaded again
+        session_log = os.path.join("test_images", UploadSessionLog.FILENAME)
+        self.assertFalse(os.path.exists(session_log))
+        for meta in service.files_by_id.values():
+            if meta['mimeType'] != 'application/vnd.google-apps.folder':
+                meta['trashed'] = True
+        report = ImageManager("test_images", service_factory=lambda: service).upload_images()
+        self.assertEqual((report.uploaded, report.skipped), (7, 0))
+        print("Concurrent image upload test passed.")
+
+    def test_image_upload_folder_index(self):
+        print("\nTesting Image Upload Folder Index...")
+        section_dir = os.path.join("test_images", "Section A")
+        for i in range(5):
+            with open(os.path.join(section_dir, f"{i}.png"), "wb") as f:
+                f.write(os.urandom(64))
+
+        service = FakeDriveService(max_page_size=3)
+        ImageManager("test_images", service_factory=lambda: service).upload_images()
+
+        # The complete run left no session log, so unchanged files are matched by MD5
+        with open(os.path.join(section_dir, "0.png"), "wb") as f:
+            f.write(os.urandom(64))
+        with open(os.path.join(section_dir, "new.png"), "wb") as f:
+            f.write(os.urandom(64))
+        calls_before = dict(service.calls)
+
+        manager = ImageManager("test_images", service_factory=lambda: service)
+        report = manager.upload_images()
+        self.assertEqual((report.uploaded, report.replaced, report.skipped), (1, 1, 5))
+        self.assertEqual(service.calls['update'] - calls_before['update'], 1)
+        # Cached root and section folders are checked with get; one listing of the section folder (2 pages of 3)
+        self.assertEqual(service.calls['get'] - calls_before['get'], 2)
+        self.assertEqual(service.calls['list'] - calls_before['list'], 2)
+        root_id = manager.folder_cache.get(DriveFolderCache.key("Chronos_Images"))
+        self.assertEqual(len(manager.list_folder(root_id)), 1)
+        print("Image upload folder index test passed.")
+
+    def test_persistent_folder_cache(self):
+        print("\nTesting Persistent Folder Cache...")
+        service = FakeDriveService()
+        manager = ImageManager("test_images", service_factory=lambda: service)
+        manager.authenticate()
+
+        # Concurrent lookups of one missing folder create it once
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            ids = set(executor.map(lambda _: manager.get_folder_id("Section A", "root_id"), range(8)))
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(service.calls['create'], 1)
+        section_id = ids.pop()
+        manager.get_folder_id("Photos", section_id)
+
+        # A new manager trusts the stored ID after a single check
+        manager = ImageManager("test_images", service_factory=lambda: service)
+        manager.authenticate()
+        lists_before = service.calls['list']
+        self.assertEqual(manager.get_folder_id("Section A", "root_id"), section_id)
+        self.assertEqual(manager.get_folder_id("Section A", "root_id"), section_id)
+        self.assertEqual((service.calls['get'], service.calls['list'] - lists_before), (1, 0))
+
+        # A trashed folder is dropped from the cache along with its subfolders
+        service.files_by_id[section_id]['trashed'] = True
+        manager = ImageManager("test_images", service_factory=lambda: service)
+        manager.authenticate()
+        new_id = manager.get_folder_id("Section A", "root_id")
+        self.assertNotEqual(new_id, section_id)
+        self.assertIsNone(manager.folder_cache.get(DriveFolderCache.key("Photos", section_id)))
+        print("Persistent folder cache test passed.")
+
+    def test_image_normalization_before_upload(self):
+        print("\nTesting Image Normalization...")
+        section_dir = os.path.join("test_images", "Section A")
+        # A landscape camera photo tagged to be shown rotated 90 degrees
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation
+        exif[0x010F] = "Phone Maker"  # Make
+        Image.new('RGB', (1200, 800), 'red').save(os.path.join(section_dir, "photo.jpg"), exif=exif)
+        Image.new('RGBA', (300, 600), (0, 0, 255, 128)).save(os.path.join(section_dir, "scan.png"))
+
+        normalizer = ImageNormalizer(os.path.join("test_images", ".normalized"), max_dimension=200, workers=1)
+        service = FakeDriveService()
+        report = ImageManager("test_images", service_factory=lambda: service, normalizer=normalizer).upload_images()
+        # The unreadable student.png from setUp is uploaded as it is
+        self.assertEqual(report.uploaded, 3)
+
+        uploaded = sorted(meta['name'] for meta in service.files_by_id.values()
+                          if meta['mimeType'] != 'application/vnd.google-apps.folder')
+        self.assertEqual(uploaded, ['photo.jpg', 'scan.jpg', 'student.png'])
+
+        normalized_photo = normalizer.normalize(os.path.join(section_dir, "photo.jpg"))
+        with Image.open(normalized_photo) as img:
+            self.assertEqual(img.size, (133, 200))
+            self.assertEqual(len(img.getexif()), 0)
+            self.assertTrue(img.info.get('progressive'))
+        with Image.open(normalizer.normalize(os.path.join(section_dir, "scan.png"))) as img:
+            self.assertEqual((img.mode, img.size), ('RGB', (100, 200)))
+
+        # Normalized copies are reused, and the cache directory is not uploaded itself
+        self.assertEqual(len(os.listdir(normalizer.cache_dir)), 2)
+        report = ImageManager("test_images", service_factory=lambda: service, normalizer=normalizer).upload_images()
+        self.assertEqual((report.uploaded, report.skipped), (0, 3))
+
+        # An original uploaded before normalization was turned on is replaced in place
+        scan = next(meta for meta in service.files_by_id.values() if meta['name'] == 'scan.jpg')
+        scan.update(name='scan.png', md5Checksum='original')
+        report = ImageManager("test_images", service_factory=lambda: service, normalizer=normalizer).upload_images()
+        self.assertEqual((report.uploaded, report.replaced, report.skipped), (0, 1, 2))
+        self.assertEqual(scan['name'], 'scan.jpg')
+
+        # An original left next to its normalized copy is trashed
+        service.files_by_id['old_scan'] = {**scan, 'name': 'scan.png', 'md5Checksum': 'original'}
+        report = ImageManager("test_images", service_factory=lambda: service, normalizer=normalizer).upload_images()
+        self.assertEqual((report.uploaded, report.replaced, report.skipped), (0, 0, 3))
+        self.assertTrue(service.files_by_id['old_scan']['trashed'])
+        print("Image normalization test passed.")
+
+    def test_normalization_after_plain_upload(self):
+        print("\nTesting Normalization After Plain Upload...")
+        photo = os.path.join("test_images", "Section A", "big.jpg")
+        Image.new('RGB', (2000, 1500), 'green').save(photo)
+
+        # The unreadable student.png is refused, so the run keeps its session log
+        service = FakeDriveService(reject_names={'student.png'})
+        report = ImageManager("test_images", service_factory=lambda: service).upload_images()
+        self.assertEqual((report.uploaded, report.failed), (1, 1))
+
+        # Turning normalization on replaces the original despite the session log
+        normalizer = ImageNormalizer(os.path.join("test_images", ".normalized"), max_dimension=200, workers=1)
+        report = ImageManager("test_images", service_factory=lambda: service, normalizer=normalizer).upload_images()
+        self.assertEqual((report.replaced, report.skipped), (1, 0))
+        drive_copy = next(meta for meta in service.files_by_id.values() if meta['name'] == 'big.jpg')
+        with open(normalizer.normalize(photo), 'rb') as f:
+            self.assertEqual(drive_copy['md5Checksum'], hashlib.md5(f.read()).hexdigest())
+        print("Normalization after plain upload test passed.")
+
+    def test_batched_folder_resolution(self):
+        print("\nTesting Batched Folder Resolution...")
+        shutil.rmtree("test_images")
+        for i in range(120):
+            os.makedirs(os.path.join("test_images", f"Section {i:03d}"))
+            with open(os.path.join("test_images", f"Section {i:03d}", "a.png"), "wb") as f:
+                f.write(os.urandom(64))
+
+        # One call inside a batch is rate limited and retried on its own
+        service = FakeDriveService(fail_statuses=[429])
+        report = ImageManager("test_images", backoff_base=0, service_factory=lambda: service).upload_images()
+        self.assertEqual(report.uploaded, 120)
+        self.assertEqual(service.calls['create'], 1 + 120 + 120)
+        # Root lookup and creation, 2 batches each of section lookups, creations and listings, 1 retry
+        self.assertEqual(service.calls['batch'], 2 + 6 + 1)
+        self.assertLessEqual(max(service.batch_sizes), 100)
+
+        # A new school year's files land in the existing folders, checked in batches
+        for i in range(120):
+            with open(os.path.join("test_images", f"Section {i:03d}", "b.png"), "wb") as f:
+                f.write(os.urandom(64))
+        batches_before, lists_before = service.calls['batch'], service.calls['list']
+        report = ImageManager("test_images", service_factory=lambda: service).upload_images()
+        self.assertEqual((report.uploaded, report.skipped), (120, 120))
+        self.assertEqual(service.calls['batch'] - batches_before, 1 + 2 + 2)
+        self.assertEqual(service.calls['list'] - lists_before, 120)
+        print("Batched folder resolution test passed.")
+
     @patch('key_manager.db')
     def test_key_upload(self, mock_db):
         print("\nTesting Key Upload (Firestore)...")
@@ -144,5 +539,268 @@ class TestAutomation(unittest.TestCase):
         self.assertTrue(os.path.exists(expected_path), f"QR code not found at {expected_path}")
         print("QR generation structure test passed.")
 
+    def test_parallel_qr_generation(self):
+        print("\nTesting Parallel QR Generation...")
+        df = pd.DataFrame({
+            'Student ID': [str(123456789000 + i) for i in range(6)],
+            'Section': ['Section A', 'Section B'] * 3,
+        })
+        df.to_excel(self.excel_path, index=False)
+
+        generator = QRCodeGenerator(encryption_key=os.urandom(32))
+        generator.set_excel_path(self.excel_path)
+        generator.set_output_path("test_qr")
+
+        success_count, failure_count, messages = generator.generate_batch_qr_codes(workers=2)
+
+        self.assertEqual((success_count, failure_count), (6, 0))
+        # Results come back in the same order as the Excel rows
+        self.assertEqual(messages, [f"Generated QR code for {sid}" for sid in df['Student ID']])
+        for sid, section in zip(df['Student ID'], df['Section']):
+            self.assertTrue(os.path.exists(os.path.join("test_qr", section, sid, f"{sid}.png")))
+        print("Parallel QR generation test passed.")
+
+    def test_qr_renderer_matches_pil_factory(self):
+        print("\nTesting Direct QR Renderer...")
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=6, border=2)
+        qr.add_data(os.urandom(40))
+        qr.make(fit=True)
+
+        expected = qr.make_image(fill_color="blue", back_color="white").convert('RGB')
+        rendered = render_qr_image(qr.get_matrix(), qr.box_size, fill_color="blue", back_color="white")
+
+        self.assertEqual(rendered.mode, 'P')
+        self.assertTrue(np.array_equal(np.asarray(expected), np.asarray(rendered.convert('RGB'))))
+        print("Direct QR renderer test passed.")
+
+    def test_qr_batch_encoder_reuses_version(self):
+        print("\nTesting QR Batch Encoder...")
+        encoder = QRBatchEncoder(mask_pattern=3)
+
+        for _ in range(3):
+            payload = os.urandom(40)
+            matrix = encoder.encode(payload).get_matrix()
+
+            reference = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M,
+                                      box_size=6, border=2, mask_pattern=3)
+            reference.add_data(payload, optimize=0)
+            reference.make(fit=True)
+            self.assertEqual(matrix, reference.get_matrix())
+
+        # One fit search for the whole batch of same-length payloads
+        self.assertEqual(list(encoder._versions), [40])
+        print("QR batch encoder test passed.")
+
+    def test_incremental_qr_generation(self):
+        print("\nTesting Incremental QR Generation...")
+        key = os.urandom(32)
+        generator = QRCodeGenerator(encryption_key=key)
+        generator.set_excel_path(self.excel_path)
+        generator.set_output_path("test_qr")
+
+        self.assertEqual(generator.generate_batch_qr_codes()[:2], (1, 0))
+        # Unchanged inputs are skipped on the re-run
+        success_count, _, messages = generator.generate_batch_qr_codes()
+        self.assertEqual(success_count, 0)
+        self.assertEqual(messages, ["QR code up to date for 123456789012"])
+
+        # A section change regenerates the code and removes the old one
+        df = pd.read_excel(self.excel_path)
+        df['Section'] = 'Section B'
+        df.to_excel(self.excel_path, index=False)
+        self.assertEqual(generator.generate_batch_qr_codes()[0], 1)
+        self.assertFalse(os.path.exists(os.path.join("test_qr", "Section A", "123456789012", "123456789012.png")))
+        self.assertTrue(os.path.exists(os.path.join("test_qr", "Section B", "123456789012", "123456789012.png")))
+
+        # A rotated key regenerates the code in place
+        rotated = QRCodeGenerator(encryption_key=os.urandom(32))
+        rotated.set_excel_path(self.excel_path)
+        rotated.set_output_path("test_qr")
+        self.assertEqual(rotated.generate_batch_qr_codes()[0], 1)
+        print("Incremental QR generation test passed.")
+
+    def test_streaming_excel_reader(self):
+        print("\nTesting Streaming Excel Reader...")
+        df = pd.DataFrame({
+            'Student ID': [str(123456789000 + i) for i in range(5)],
+            'Section': ['Section A'] * 5,
+        })
+        df.to_excel(self.excel_path, index=False)
+
+        chunks = list(iter_excel_chunks(self.excel_path, ['Student ID', 'Section'], chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(list(pd.concat(chunks)['Student ID']), list(df['Student ID']))
+
+        with self.assertRaises(ValueError):
+            next(iter_excel_chunks(self.excel_path, ['LRN']))
+        print("Streaming Excel reader test passed.")
+
+    def test_batch_encryption(self):
+        print("\nTesting Batch Encryption...")
+        crypto = QRCodeCrypto(os.urandom(32))
+        payloads = [{'lrn': str(123456789000 + i), 'section': 'Section A'} for i in range(5)]
+
+        blobs = crypto.encrypt_many(payloads)
+        self.assertEqual(len({blob[:12] for blob in blobs}), 5)  # Unique nonces
+        self.assertEqual(crypto.decrypt_many(blobs), [str(payload) for payload in payloads])
+        self.assertEqual(crypto.decrypt_data(blobs[0]), str(payloads[0]))
+
+        # Blobs made with pycryptodome by earlier versions still decrypt
+        nonce = os.urandom(12)
+        ciphertext, tag = AES.new(crypto.key, AES.MODE_GCM, nonce=nonce).encrypt_and_digest(b'123456789012')
+        self.assertEqual(crypto.decrypt_data(nonce + tag + ciphertext), '123456789012')
+
+        tampered = blobs[1][:-1] + bytes([blobs[1][-1] ^ 1])
+        with self.assertRaises(ValueError):
+            crypto.decrypt_many([blobs[0], tampered])
+        print("Batch encryption test passed.")
+
+    def test_compact_payload(self):
+        print("\nTesting Compact QR Payload...")
+        crypto = QRCodeCrypto(os.urandom(32))
+        payload = crypto.encrypt_lrn('012345678901')
+        self.assertEqual(len(payload), 26)
+        self.assertEqual(payload[0], 0x10)
+        self.assertEqual(crypto.decrypt_payload(payload), '012345678901')
+        # Legacy payloads still decrypt through the same entry point
+        self.assertEqual(crypto.decrypt_payload(crypto.encrypt_data('123456789012')), '123456789012')
+
+        # The header is authenticated
+        with self.assertRaises(ValueError):
+            crypto.decrypt_payload(payload[:1] + bytes([payload[1] ^ 1]) + payload[2:])
+        with self.assertRaises(ValueError):
+            crypto.encrypt_lrn('12345')
+
+        key = os.urandom(32)
+        generator = QRCodeGenerator(encryption_key=key, compact_payload=True)
+        generator.set_excel_path(self.excel_path)
+        generator.set_output_path("test_qr")
+        self.assertEqual(generator.generate_batch_qr_codes()[:2], (1, 0))
+        self.assertEqual(generator.qr_encoder.qr.version, 2)
+
+        # Switching back to the legacy format regenerates the code
+        legacy = QRCodeGenerator(encryption_key=key)
+        legacy.set_excel_path(self.excel_path)
+        legacy.set_output_path("test_qr")
+        self.assertEqual(legacy.generate_batch_qr_codes()[0], 1)
+        self.assertEqual(legacy.qr_encoder.qr.version, 3)
+        print("Compact QR payload test passed.")
+
+    def test_qr_benchmark(self):
+        print("\nTesting QR Benchmark Harness...")
+        results = run_benchmark(students=5, compact_payload=True, output_dir="test_qr")
+        self.assertEqual(results['failures'], 0)
+        self.assertEqual(results['qr_version'], 2)
+        self.assertGreater(results['images_per_second'], 0)
+        for stage in ['encrypt', 'build', 'render', 'png_write', 'decrypt']:
+            self.assertLessEqual(results['stages'][stage]['p50_ms'], results['stages'][stage]['max_ms'])
+        self.assertEqual(len(os.listdir("test_qr")), 5)
+        print("QR benchmark harness test passed.")
+
+    @unittest.skipIf(qr_scan.zbar_decode is None, "zbar library not available")
+    def test_qr_audit(self):
+        print("\nTesting QR Output Audit...")
+        key = os.urandom(32)
+        generator = QRCodeGenerator(encryption_key=key)
+        generator.set_output_path("test_qr")
+
+        students = {str(123456789000 + i): 'Section A' for i in range(5)}
+        for lrn, section in students.items():
+            generator.generate_qr_code({'Student ID': lrn, 'Section': section})
+        ids = list(students)
+        png = lambda lrn: os.path.join("test_qr", "Section A", lrn, f"{lrn}.png")
+        shutil.copyfile(png(ids[0]), png(ids[1]))  # Code of another student
+        Image.new('L', (100, 100), 255).save(png(ids[2]))  # Unreadable
+        old_generator = QRCodeGenerator(encryption_key=os.urandom(32))  # Old key
+        old_generator.set_output_path("test_qr")
+        old_generator.generate_qr_code({'Student ID': ids[3], 'Section': 'Section A'}, overwrite=True)
+        os.remove(png(ids[4]))
+
+        db_path = os.path.join("test_qr", "master_list.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute('CREATE TABLE master_list (lrn TEXT PRIMARY KEY, section TEXT)')
+        conn.executemany('INSERT INTO master_list VALUES (?, ?)', students.items())
+        conn.commit()
+        conn.close()
+
+        report = qr_audit.audit_output_tree("test_qr", key, db_path, workers=1)
+
+        self.assertEqual(report.checked, 4)
+        self.assertEqual(report.ok, 1)
+        self.assertEqual([m['decoded_lrn'] for m in report.mismatches], [ids[0]])
+        self.assertEqual([u['student_id'] for u in report.unreadable], [ids[2]])
+        self.assertEqual([d['student_id'] for d in report.decrypt_failed], [ids[3]])
+        self.assertEqual([m['student_id'] for m in report.missing_students], [ids[4]])
+        self.assertFalse(report.passed)
+        print("QR output audit test passed.")
+
+    @unittest.skipIf(qr_scan.zbar_decode is None, "zbar library not available")
+    def test_qr_benchmark_decode(self):
+        print("\nTesting QR Benchmark Decode Stage...")
+        for compact_payload in (False, True):
+            results = run_benchmark(students=5, compact_payload=compact_payload, output_dir="test_qr")
+            self.assertTrue(results['decode_verified'])
+            self.assertEqual(results['failures'], 0)
+        print("QR benchmark decode stage test passed.")
+
+    def test_scanned_payload_transcoding(self):
+        print("\nTesting Scanned Payload Transcoding...")
+        keyring = QRKeyring()
+        keyring.add_key(os.urandom(32))
+        lrn = '123456789012'
+        # zbar guesses Latin-1 for most binary payloads and returns them as UTF-8
+        for payload in (keyring.encrypt_lrn(lrn), keyring.active.encrypt_data(lrn)):
+            scanned = payload.decode('latin-1').encode('utf-8')
+            self.assertEqual(qr_scan.decrypt_scanned(keyring, scanned), lrn)
+            self.assertEqual(qr_scan.decrypt_scanned(keyring, payload), lrn)
+
+        # Data guessed as Shift-JIS, with iconv's yen sign and overline for 0x5C and 0x7E
+        scanned = '\u00a5\u203e\u30a2'.encode('utf-8')
+        self.assertIn(b'\x5c\x7e\x83\x41', qr_scan.payload_candidates(scanned))
+        with self.assertRaises(ValueError):
+            qr_scan.decrypt_scanned(keyring, scanned)
+        print("Scanned payload transcoding test passed.")
+
+    def test_keyring_rotation(self):
+        print("\nTesting Keyring Rotation...")
+        keyring = QRKeyring()
+        old_id = keyring.add_key(os.urandom(32))
+        old_payload = keyring.encrypt_lrn('123456789012')
+        legacy_payload = keyring.active.encrypt_data('123456789012')
+        new_id = keyring.add_key(os.urandom(32))
+        self.assertEqual((old_id, new_id), (0, 1))
+        self.assertEqual(keyring.encrypt_lrn('123456789013')[0], 0x21)
+
+        # Old codes decrypt by key ID, legacy codes by trying each key
+        restored = QRKeyring.from_dict(keyring.to_dict())
+        self.assertEqual(restored.active_key_id, new_id)
+        self.assertEqual(restored.decrypt_payload(old_payload), '123456789012')
+        self.assertEqual(restored.decrypt_payload(legacy_payload), '123456789012')
+        restored.remove_key(old_id)
+        with self.assertRaises(ValueError):
+            restored.decrypt_payload(old_payload)
+
+        # Regenerating codes of the old key is spread over several runs
+        pd.DataFrame({
+            'Student ID': [str(123456789000 + i) for i in range(3)],
+            'Section': ['Section A'] * 3,
+        }).to_excel(self.excel_path, index=False)
+        rotating = QRKeyring({0: keyring.get(old_id).key})
+        generator = QRCodeGenerator(keyring=rotating, compact_payload=True)
+        generator.set_excel_path(self.excel_path)
+        generator.set_output_path("test_qr")
+        self.assertEqual(generator.generate_batch_qr_codes()[0], 3)
+
+        rotating.add_key(keyring.get(new_id).key)
+        generator = QRCodeGenerator(keyring=rotating, compact_payload=True)
+        generator.set_excel_path(self.excel_path)
+        generator.set_output_path("test_qr")
+        self.assertEqual(generator.generate_batch_qr_codes(rotation_batch=2)[0], 2)
+        success_count, _, messages = generator.generate_batch_qr_codes(rotation_batch=2)
+        self.assertEqual(success_count, 1)
+        self.assertEqual(messages.count("QR code up to date for 123456789000"), 1)
+        self.assertEqual(generator.generate_batch_qr_codes(rotation_batch=2)[0], 0)
+        print("Keyring rotation test passed.")
+
 if __name__ == '__main__':
     unittest.main()
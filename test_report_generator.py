@@ -0,0 +1,215 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os
+import shutil
+import sqlite3
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from report_generator import ExcelReportGenerator, StatisticsGenerator
+from attendance_cache import AttendanceCache
+
+STUDENTS = [
+    ('123456789012', 'Doe', 'John', 12, 'Section A'),
+    ('123456789013', 'Roe', 'Jane', 12, 'Section A'),
+]
+
+
+def make_doc(lrn, day, is_absent, month=9):
+    """Builds a fake Firestore attendance snapshot."""
+    student = next(s for s in STUDENTS if s[0] == lrn)
+    doc = MagicMock()
+    doc.id = f"{lrn}-{month}-{day}"
+    doc.to_dict.return_value = {
+        'lrn': lrn,
+        'lastName': student[1],
+        'firstName': student[2],
+        'studentYear': student[3],
+        'studentSection': student[4],
+        'timestamp': datetime(2025, month, day, 7, 30, tzinfo=timezone.utc),
+        'isAbsent': is_absent,
+    }
+    return doc
+
+
+class TestReportGenerator(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs("test_reports", exist_ok=True)
+        self.master_list_db = os.path.join("test_reports", "master_list.db")
+        conn = sqlite3.connect(self.master_list_db)
+        conn.execute('''
+            CREATE TABLE master_list (
+                lrn TEXT PRIMARY KEY, last_name TEXT, first_name TEXT,
+                student_year INT, section TEXT, adviser TEXT, gender TEXT
+            )
+        ''')
+        conn.executemany("INSERT INTO master_list VALUES (?, ?, ?, ?, ?, 'Mr. Smith', 'M')", STUDENTS)
+        conn.commit()
+        conn.close()
+
+        self.docs = []
+        for month in (9, 10):
+            for day in (1, 2, 3):
+                # Roe comes first, so rows must be sorted rather than kept in record order
+                self.docs.append(make_doc('123456789013', day, is_absent=(day == 3 and month == 10), month=month))
+                self.docs.append(make_doc('123456789012', day, is_absent=(day == 2), month=month))
+
+        self.start_date = datetime(2025, 9, 1, tzinfo=timezone.utc)
+        self.end_date = datetime(2025, 10, 31, tzinfo=timezone.utc)
+
+    def tearDown(self):
+        shutil.rmtree("test_reports")
+
+    def read_report(self, path):
+        return pd.read_excel(path, sheet_name=None, header=None)
+
+    @patch('report_generator.FirestoreDataImporter')
+    def test_absences_only_report_matches_full_report(self, mock_importer_cls):
+        print("\nTesting Absences-Only Report Mode...")
+        mock_importer = mock_importer_cls.return_value
+        mock_importer.import_data.return_value = self.docs
+        mock_importer.import_absences.return_value = [
+            doc for doc in self.docs if doc.to_dict()['isAbsent']
+        ]
+
+        generator = ExcelReportGenerator(MagicMock(), master_list_db=self.master_list_db)
+        full_path = os.path.join("test_reports", "full.xlsx")
+        absences_path = os.path.join("test_reports", "absences.xlsx")
+        generator.generate_report(self.start_date, self.end_date, full_path)
+        generator.generate_report(self.start_date, self.end_date, absences_path, absences_only=True)
+
+        full = self.read_report(full_path)
+        absences = self.read_report(absences_path)
+        self.assertEqual(list(full), ['September-2025', 'October-2025'])
+        self.assertEqual(list(full), list(absences))
+        for month in full:
+            pd.testing.assert_frame_equal(full[month], absences[month])
+
+        september = full['September-2025']
+        self.assertEqual(list(september.iloc[1, :5]), ['LRN', 'Last Name', 'First Name', 'Year', 'Section'])
+        self.assertEqual(list(september.iloc[2:, 1]), ['Doe', 'Roe'])
+        # John was absent on Tuesday the 2nd
+        john = september[september[0].astype(str) == '123456789012'].iloc[0]
+        self.assertEqual(john[6], 'A')
+        self.assertEqual(john.iloc[-2], 1)
+        print("Absences-only report mode test passed.")
+
+    @patch('report_generator.FirestoreDataImporter')
+    def test_parallel_report_matches_serial_report(self, mock_importer_cls):
+        print("\nTesting Parallel Report Generation...")
+        mock_importer_cls.return_value.import_data.return_value = self.docs
+
+        generator = ExcelReportGenerator(MagicMock(), master_list_db=self.master_list_db)
+        serial_path = os.path.join("test_reports", "serial.xlsx")
+        parallel_path = os.path.join("test_reports", "parallel.xlsx")
+        generator.generate_report(self.start_date, self.end_date, serial_path)
+        generator.generate_report(self.start_date, self.end_date, parallel_path, workers=2)
+
+        serial = self.read_report(serial_path)
+        parallel = self.read_report(parallel_path)
+        self.assertEqual(list(serial), list(parallel))
+        for month in serial:
+            pd.testing.assert_frame_equal(serial[month], parallel[month])
+        print("Parallel report generation test passed.")
+
+    @patch('report_generator.FirestoreDataImporter')
+    def test_cached_report_fetches_only_new_records(self, mock_importer_cls):
+        print("\nTesting Attendance Cache...")
+        mock_importer = mock_importer_cls.return_value
+        mock_importer.import_data.return_value = self.docs
+        cache = AttendanceCache(os.path.join("test_reports", "attendance_cache.db"),
+                                reconciliation_window=timedelta(days=2), max_age=None)
+
+        generator = ExcelReportGenerator(MagicMock(), master_list_db=self.master_list_db)
+        direct_path = os.path.join("test_reports", "direct.xlsx")
+        cached_path = os.path.join("test_reports", "cached.xlsx")
+        generator.generate_report(self.start_date, self.end_date, direct_path)
+        mock_importer.import_data.reset_mock()
+        generator.generate_report(self.start_date, self.end_date, cached_path, cache=cache)
+        mock_importer.import_data.assert_called_once_with(self.start_date, self.end_date, None)
+
+        direct = self.read_report(direct_path)
+        cached = self.read_report(cached_path)
+        self.assertEqual(list(direct), list(cached))
+        for month in direct:
+            pd.testing.assert_frame_equal(direct[month], cached[month])
+
+        # Only the reconciliation window before the high-water mark is fetched again
+        mock_importer.import_data.reset_mock()
+        mock_importer.import_data.return_value = []
+        generator.generate_report(self.start_date, self.end_date, cached_path, cache=cache)
+        fetch_from = mock_importer.import_data.call_args[0][0]
+        self.assertEqual(fetch_from, self.end_date - timedelta(days=2))
+
+        # September is settled, so it is built offline
+        mock_importer.import_data.reset_mock()
+        september_path = os.path.join("test_reports", "september.xlsx")
+        generator.generate_report(self.start_date, datetime(2025, 9, 30, tzinfo=timezone.utc),
+                                  september_path, cache=cache)
+        mock_importer.import_data.assert_not_called()
+        pd.testing.assert_frame_equal(self.read_report(september_path)['September-2025'],
+                                      direct['September-2025'])
+
+        # Evicting by size drops the oldest records and the range they covered
+        cache.max_records = 6
+        self.assertEqual(cache.evict(), 6)
+        generator.generate_report(self.start_date, datetime(2025, 9, 30, tzinfo=timezone.utc),
+                                  september_path, cache=cache)
+        mock_importer.import_data.assert_called_once()
+        print("Attendance cache test passed.")
+
+    def test_cache_fetches_gaps_between_out_of_order_ranges(self):
+        print("\nTesting Attendance Cache Gaps...")
+        docs = [make_doc('123456789012', day, is_absent=False, month=month)
+                for month in (9, 10, 11, 12) for day in (1, 2, 3)]
+        importer = MagicMock()
+        importer.import_data.side_effect = lambda start, end, section: [
+            doc for doc in docs if start <= doc.to_dict()['timestamp'] <= end
+        ]
+
+        def months(first, last):
+            return (datetime(2025, first, 1, tzinfo=timezone.utc),
+                    datetime(2025, last, 28, tzinfo=timezone.utc))
+
+        # Sep-Oct, then Dec: November was never asked for
+        cache = AttendanceCache(os.path.join("test_reports", "forward.db"), max_age=None)
+        cache.get_records(importer, *months(9, 10))
+        cache.get_records(importer, *months(12, 12))
+        self.assertEqual(len(cache.get_records(importer, *months(11, 11))), 3)
+
+        # Dec, then Sep: October and November were never asked for
+        cache = AttendanceCache(os.path.join("test_reports", "backward.db"), max_age=None)
+        cache.get_records(importer, *months(12, 12))
+        cache.get_records(importer, *months(9, 9))
+        self.assertEqual(len(cache.get_records(importer, *months(10, 11))), 6)
+        print("Attendance cache gaps test passed.")
+
+    @patch('report_generator.FirestoreDataImporter')
+    def test_snapshot_report_matches_fetched_report(self, mock_importer_cls):
+        print("\nTesting Attendance Snapshots...")
+        mock_importer_cls.return_value.import_data.return_value = self.docs
+
+        generator = ExcelReportGenerator(MagicMock(), master_list_db=self.master_list_db)
+        snapshot_path = os.path.join("test_reports", "attendance.arrow")
+        fetched_path = os.path.join("test_reports", "fetched.xlsx")
+        snapshot_report_path = os.path.join("test_reports", "snapshot.xlsx")
+        generator.generate_report(self.start_date, self.end_date, fetched_path, snapshot_path=snapshot_path)
+        mock_importer_cls.reset_mock()
+        generator.generate_report_from_snapshot(snapshot_path, self.start_date, self.end_date, snapshot_report_path)
+        mock_importer_cls.assert_not_called()
+
+        fetched = self.read_report(fetched_path)
+        from_snapshot = self.read_report(snapshot_report_path)
+        self.assertEqual(list(fetched), list(from_snapshot))
+        for month in fetched:
+            pd.testing.assert_frame_equal(fetched[month], from_snapshot[month])
+
+        stats = StatisticsGenerator.from_snapshot(snapshot_path, end_date=datetime(2025, 9, 30))
+        self.assertEqual(len(stats.df), 6)
+        self.assertEqual(stats.df['isAbsent'].dtype, bool)
+        self.assertEqual(stats.df['studentSection'].dtype, 'category')
+        print("Attendance snapshot test passed.")
+
+
+if __name__ == '__main__':
+    unittest.main()